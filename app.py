@@ -1,4 +1,5 @@
 import os
+import json
 import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
@@ -7,21 +8,65 @@ from flask_cors import CORS
 from datetime import timedelta
 import os
 from extensions import db
+from utils.compression import init_compression
+from utils.json_provider import FastJSONProvider
+from utils.admission import init_admission
+from commands import register_commands
 jwt = JWTManager()
 db_url = os.getenv('DATABASE_URL')
 def create_app(config_name='development'):
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     
     # Configuration
     app.config['SQLALCHEMY_DATABASE_URI'] = db_url
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Pool sizing is shared with gunicorn.conf.py to derive worker_connections.
+    # SQLite doesn't use a QueuePool and rejects these options.
+    if db_url and not db_url.startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_pre_ping': True,
+        }
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=30)
+    app.config['QR_SIGNING_KEY'] = os.environ.get('QR_SIGNING_KEY')
+    # Legacy cards embed the bare UUID; disable once all cards are reissued
+    app.config['QR_ALLOW_UNSIGNED'] = os.environ.get('QR_ALLOW_UNSIGNED', 'true').lower() == 'true'
+    # Optional Postgres range partitioning of medical_history (see migrations/partition_history.py);
+    # upcoming partitions are created by gunicorn's on_starting hook or `flask history ensure-partitions`
+    app.config['HISTORY_PARTITIONING'] = os.environ.get('HISTORY_PARTITIONING', 'false').lower() == 'true'
+    app.config['HISTORY_PARTITION_YEARS_AHEAD'] = int(os.environ.get('HISTORY_PARTITION_YEARS_AHEAD', 1))
+    app.config['HISTORY_ARCHIVE_AFTER_DAYS'] = int(os.environ.get('HISTORY_ARCHIVE_AFTER_DAYS', 730))
+    # Background jobs (utils/jobs.py, run with `flask jobs worker`)
+    app.config['JOB_RESULTS_DIR'] = os.environ.get('JOB_RESULTS_DIR', 'job_results')
+    app.config['JOB_RESULT_TTL_HOURS'] = int(os.environ.get('JOB_RESULT_TTL_HOURS', 24))
+    app.config['JOB_MAX_ATTEMPTS'] = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    app.config['JOB_TIMEOUT_SECONDS'] = int(os.environ.get('JOB_TIMEOUT_SECONDS', 3600))
+    # Running jobs are requeued by other workers once their heartbeat is this old
+    app.config['JOB_HEARTBEAT_TIMEOUT_SECONDS'] = int(os.environ.get('JOB_HEARTBEAT_TIMEOUT_SECONDS', 120))
+    app.config['JOB_MAX_CARDS'] = int(os.environ.get('JOB_MAX_CARDS', 5000))
+    # Batch card printing (POST /api/doctor/cards/batch)
+    app.config['CARD_BATCH_MAX'] = int(os.environ.get('CARD_BATCH_MAX', 1000))
+    # Per web process (workers x this in total); ignored under gevent, which renders on OFFLOAD_THREADS
+    app.config['CARD_RENDER_PROCESSES'] = int(os.environ.get('CARD_RENDER_PROCESSES', min(2, os.cpu_count() or 1)))
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    # Admission control (utils/admission.py). ADMISSION_COST_CLASSES is JSON overriding
+    # the defaults per class, e.g. {"kdf": {"limit": 8, "queue": 16}}
+    app.config['ADMISSION_COST_CLASSES'] = json.loads(os.environ.get('ADMISSION_COST_CLASSES') or 'null')
+    app.config['LOGIN_THROTTLE_STORE'] = os.environ.get('LOGIN_THROTTLE_STORE', 'database')
+    app.config['LOGIN_ACCOUNT_BURST'] = int(os.environ.get('LOGIN_ACCOUNT_BURST', 5))
+    app.config['LOGIN_ACCOUNT_PER_MINUTE'] = float(os.environ.get('LOGIN_ACCOUNT_PER_MINUTE', 5))
+    app.config['LOGIN_IP_BURST'] = int(os.environ.get('LOGIN_IP_BURST', 20))
+    app.config['LOGIN_IP_PER_MINUTE'] = float(os.environ.get('LOGIN_IP_PER_MINUTE', 30))
 
     # Initialize extensions
     db.init_app(app)
     jwt.init_app(app)
     CORS(app)
+    init_compression(app)
+    init_admission(app)
     
     # Setup logging
     setup_logging(app)
@@ -30,18 +75,21 @@ def create_app(config_name='development'):
     import models
     models.db = db
     
-    from models import User, Doctor, MedicalHistory, Amendment
+    from models import User, Doctor, MedicalHistory, Amendment, TestType, ArchivedHistory, Job
     
     # Register blueprints
     from routes.auth import auth_bp
     from routes.user import user_bp
     from routes.doctor import doctor_bp
     from routes.health import health_bp
+    from routes.jobs import jobs_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(user_bp, url_prefix='/api/user')
     app.register_blueprint(doctor_bp, url_prefix='/api/doctor')
     app.register_blueprint(health_bp)
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    register_commands(app)
     
     # Create tables
     with app.app_context():
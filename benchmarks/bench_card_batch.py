@@ -0,0 +1,39 @@
+"""Batch card rendering throughput (cards/s), serial vs parallel, ZIP vs PDF.
+
+Runs without a database using synthetic users. From the repo root:
+
+    python -m benchmarks.bench_card_batch [cards]
+"""
+import os
+import sys
+import time
+import uuid
+from utils.card_batch import card_batch_chunks
+
+def make_items(n):
+    items = []
+    for i in range(n):
+        user_uuid = str(uuid.uuid4())
+        user = {
+            'uuid': user_uuid, 'first_name': 'Bench', 'last_name': f'User {i}',
+            'email': f'bench{i}@example.com', 'phone': '555-0100', 'date_of_birth': '1990-01-15',
+        }
+        # Unsigned payload of the same length as a real NX1 payload
+        items.append((user, 'NX1.' + 'A' * 26 + '.' + 'B' * 16))
+    return items
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    items = make_items(n)
+    cores = os.cpu_count() or 1
+
+    print(f"{'format':<6} {'processes':>9} {'seconds':>8} {'cards/s':>8} {'MB':>8}")
+    for fmt in ('zip', 'pdf'):
+        for processes in sorted({1, cores}):
+            start = time.perf_counter()
+            size = sum(len(chunk) for chunk in card_batch_chunks(items, fmt, processes=processes))
+            elapsed = time.perf_counter() - start
+            print(f"{fmt:<6} {processes:>9} {elapsed:>8.2f} {n / elapsed:>8.1f} {size / 1e6:>8.2f}")
+
+if __name__ == '__main__':
+    main()
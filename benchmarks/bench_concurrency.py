@@ -0,0 +1,99 @@
+"""Mixed I/O + CPU load against a running server.
+
+Start the server once per mode and compare the numbers:
+
+    GUNICORN_WORKER_CLASS=sync   gunicorn -c gunicorn.conf.py app:app
+    GUNICORN_WORKER_CLASS=gevent gunicorn -c gunicorn.conf.py app:app
+
+    python benchmarks/bench_concurrency.py http://localhost:8000 [clients] [seconds]
+
+Each client signs up its own account, then loops over a login (KDF), a
+profile read (DB) and a card render (PIL), and reports throughput plus
+latency percentiles per call. Requests shed by admission control (503) or
+the login throttle (429) are counted separately rather than timed.
+"""
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+def call(method, url, body=None, token=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method)
+    req.add_header('Content-Type', 'application/json')
+    if token:
+        req.add_header('Authorization', f'Bearer {token}')
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req) as resp:
+            status, payload = resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        status, payload = e.code, e.read()
+    return status, payload, time.perf_counter() - start
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] * 1000 if values else 0.0
+
+def main():
+    base = sys.argv[1].rstrip('/') if len(sys.argv) > 1 else 'http://localhost:8000'
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    duration = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    latencies = {'login': [], 'profile': [], 'card': []}
+    rejected = {name: {429: 0, 503: 0} for name in latencies}
+    errors = []
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def record(name, status, elapsed):
+        with lock:
+            if status in (429, 503):
+                rejected[name][status] += 1
+            elif status >= 400:
+                errors.append((name, status))
+            else:
+                latencies[name].append(elapsed)
+        return status < 400
+
+    def client():
+        # One account per client so the per-account login throttle isn't the bottleneck
+        creds = {'email': f'bench-{uuid.uuid4().hex[:12]}@example.com', 'password': 'bench-password'}
+        while time.time() < deadline:
+            status, _, _ = call('POST', f'{base}/api/auth/user/signup', dict(creds, first_name='Bench', last_name='User'))
+            if status in (201, 409):
+                break
+            time.sleep(0.5)
+
+        while time.time() < deadline:
+            status, body, elapsed = call('POST', f'{base}/api/auth/user/login', creds)
+            if not record('login', status, elapsed):
+                time.sleep(0.1)
+                continue
+            token = json.loads(body)['access_token']
+            status, _, elapsed = call('GET', f'{base}/api/user/profile', token=token)
+            record('profile', status, elapsed)
+            status, _, elapsed = call('GET', f'{base}/api/user/generate-card', token=token)
+            record('card', status, elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"{clients} clients, {duration:.0f}s: {total / duration:.1f} req/s")
+    print(f"{'call':<8} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'429':>6} {'503':>6}")
+    for name, values in latencies.items():
+        print(f"{name:<8} {len(values):>6} {percentile(values, .5):>8.1f} "
+              f"{percentile(values, .95):>8.1f} {percentile(values, .99):>8.1f} "
+              f"{rejected[name][429]:>6} {rejected[name][503]:>6}")
+    if errors:
+        print(f"{len(errors)} other errors, e.g. {errors[0]}")
+
+if __name__ == '__main__':
+    main()
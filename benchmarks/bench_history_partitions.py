@@ -0,0 +1,89 @@
+"""Recent-history query latency at scale against a local Postgres.
+
+The schema must already exist (start the app once against DATABASE_URL).
+Seed synthetic rows, measure, convert to partitions, then measure again:
+
+    python benchmarks/bench_history_partitions.py --seed --rows 5000000
+    python -m migrations.partition_history
+    python benchmarks/bench_history_partitions.py
+
+Reports p50/p95 latency of "last two years for one patient" and how many
+partitions the plan touches.
+"""
+import argparse
+import os
+import random
+import time
+from sqlalchemy import create_engine, text
+
+RECENT_SQL = text("""
+    SELECT id, entry_date, test_type_id
+    FROM medical_history
+    WHERE user_id = :user_id AND entry_date >= now() - interval '2 years'
+    ORDER BY entry_date DESC
+    LIMIT 50
+""")
+
+def seed(conn, rows, users):
+    conn.execute(text("""
+        INSERT INTO doctors (email, password_hash, first_name, last_name, license_number, hospital, created_at, updated_at)
+        VALUES ('bench-doctor@example.com', 'x', 'Bench', 'Doctor', 'BENCH-1', 'Bench', now(), now())
+        ON CONFLICT DO NOTHING
+    """))
+    conn.execute(text("""
+        INSERT INTO test_types (key, name) VALUES ('blood test', 'Blood Test'), ('x-ray', 'X-Ray')
+        ON CONFLICT DO NOTHING
+    """))
+    conn.execute(text("""
+        INSERT INTO users (uuid, email, password_hash, first_name, last_name, created_at, updated_at)
+        SELECT gen_random_uuid(), 'bench-' || g || '-' || md5(random()::text) || '@example.com', 'x', 'Bench', 'User', now(), now()
+        FROM generate_series(1, :users) g
+    """), {'users': users})
+    conn.execute(text("""
+        INSERT INTO medical_history (user_id, doctor_id, test_type_id, entry_date, test_results, notes, is_amended, created_at, updated_at)
+        SELECT u.ids[1 + floor(random() * array_length(u.ids, 1))::int],
+               (SELECT id FROM doctors WHERE email = 'bench-doctor@example.com'),
+               (SELECT min(id) FROM test_types),
+               now() - random() * interval '10 years',
+               repeat('result ', 40), repeat('note ', 20), false, now(), now()
+        FROM generate_series(1, :rows),
+             (SELECT array_agg(id) AS ids FROM users WHERE email LIKE 'bench-%') u
+    """), {'rows': rows})
+    conn.execute(text("ANALYZE"))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', action='store_true')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    engine = create_engine(os.environ['DATABASE_URL'])
+
+    if args.seed:
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            seed(conn, args.rows, args.users)
+        print(f"Seeded {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+    with engine.connect() as conn:
+        total = conn.execute(text("SELECT count(*) FROM medical_history")).scalar()
+        user_ids = [r[0] for r in conn.execute(text("SELECT DISTINCT user_id FROM medical_history LIMIT 5000"))]
+
+        timings = []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            conn.execute(RECENT_SQL, {'user_id': random.choice(user_ids)}).all()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+
+        plan = conn.execute(text("EXPLAIN " + RECENT_SQL.text), {'user_id': user_ids[0]}).all()
+        scanned = sum(1 for (line,) in plan if 'on medical_history' in line)
+
+    print(f"{total:,} rows, {args.queries} queries: "
+          f"p50 {timings[len(timings) // 2]:.2f} ms, p95 {timings[int(len(timings) * .95)]:.2f} ms, "
+          f"relations in plan: {scanned}")
+
+if __name__ == '__main__':
+    main()
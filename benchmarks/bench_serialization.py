@@ -0,0 +1,71 @@
+"""Payload size and serialization time for history responses.
+
+Compares full vs projected (`fields=`) payloads, Flask's default JSON
+provider vs FastJSONProvider, and identity vs gzip vs brotli encoding.
+Payloads go through `app.json.response`, the same path as `jsonify`.
+Runs without a database. From the repo root:
+
+    python -m benchmarks.bench_serialization [entries]
+"""
+import gzip
+import sys
+import time
+from datetime import datetime
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from utils.json_provider import FastJSONProvider, orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def make_entry(i):
+    now = datetime(2024, 1, 1).isoformat()
+    return {
+        'id': i,
+        'test_type': 'Blood Test',
+        'test_results': 'Haemoglobin 13.5 g/dL, WBC 6.1, platelets 250. ' * 20,
+        'diagnosis': 'Within normal limits',
+        'prescription': 'None',
+        'notes': 'Patient reports mild fatigue; follow up in 3 months. ' * 10,
+        'is_amended': False,
+        'entry_date': now,
+        'created_at': now,
+        'updated_at': now,
+        'doctor': {
+            'id': 1, 'email': 'doc@example.com', 'first_name': 'Ada', 'last_name': 'Obi',
+            'license_number': 'LIC-1', 'hospital': 'General', 'specialization': 'GP',
+            'phone': '555-0100', 'created_at': now,
+        },
+    }
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    full = {'message': 'Medical history retrieved', 'count': n, 'data': [make_entry(i) for i in range(n)]}
+    projected = dict(full, data=[{k: e[k] for k in ('id', 'test_type', 'entry_date')} for e in full['data']])
+
+    providers = [('default', DefaultJSONProvider), ('fast', FastJSONProvider)]
+    if orjson is None:
+        print('orjson is not installed; FastJSONProvider falls back to the stdlib')
+
+    print(f"{'payload':<10} {'provider':<8} {'ms':>8} {'bytes':>10} {'gzip':>10} {'br':>10}")
+    for label, payload in (('full', full), ('projected', projected)):
+        for name, provider in providers:
+            app = Flask(__name__)
+            app.json = provider(app)
+            with app.app_context():
+                response, ms = timed(lambda: app.json.response(payload))
+            body = response.get_data()
+            gz = len(gzip.compress(body, compresslevel=6))
+            br = len(brotli.compress(body, quality=4)) if brotli is not None else '-'
+            print(f"{label:<10} {name:<8} {ms:>8.2f} {len(body):>10} {gz:>10} {br:>10}")
+
+if __name__ == '__main__':
+    main()
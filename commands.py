@@ -0,0 +1,54 @@
+# commands.py
+import os
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from extensions import db
+
+history_cli = AppGroup('history', help='Medical history maintenance')
+
+@history_cli.command('ensure-partitions')
+@click.option('--years-ahead', default=None, type=int, help='Yearly partitions to create beyond the current year')
+def ensure_partitions_command(years_ahead):
+    """Create upcoming medical_history partitions (partitioned mode only)"""
+    from utils.partitions import ensure_partitions
+
+    years_ahead = years_ahead if years_ahead is not None else current_app.config['HISTORY_PARTITION_YEARS_AHEAD']
+    with db.engine.begin() as conn:
+        if ensure_partitions(conn, years_ahead=years_ahead):
+            click.echo(f"Partitions ensured {years_ahead} year(s) ahead")
+        else:
+            click.echo("medical_history is not partitioned; nothing to do")
+
+@history_cli.command('archive')
+@click.option('--older-than-days', default=None, type=int, help='Defaults to HISTORY_ARCHIVE_AFTER_DAYS')
+@click.option('--batch-size', default=500, type=int)
+def archive_command(older_than_days, batch_size):
+    """Move old medical_history entries into the compressed archive table"""
+    from utils.archive import archive_entries
+
+    older_than_days = older_than_days or current_app.config['HISTORY_ARCHIVE_AFTER_DAYS']
+    count = archive_entries(older_than_days, batch_size=batch_size)
+    click.echo(f"Archived {count} entries older than {older_than_days} days")
+
+jobs_cli = AppGroup('jobs', help='Background job runner')
+
+@jobs_cli.command('worker')
+@click.option('--concurrency', default=None, type=int, help='Parallel job processes (default: CPU count)')
+@click.option('--poll-interval', default=1.0, type=float)
+def worker_command(concurrency, poll_interval):
+    """Claim and run queued jobs until interrupted"""
+    from utils.jobs import run_worker
+
+    run_worker(concurrency or os.cpu_count() or 2, poll_interval=poll_interval)
+
+@jobs_cli.command('expire')
+def expire_command():
+    """Delete job results past their TTL"""
+    from utils.jobs import expire_results
+
+    click.echo(f"Expired {expire_results()} job results")
+
+def register_commands(app):
+    app.cli.add_command(history_cli)
+    app.cli.add_command(jobs_cli)
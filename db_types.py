@@ -0,0 +1,36 @@
+# db_types.py
+import uuid
+from sqlalchemy.types import TypeDecorator, BINARY
+from sqlalchemy.dialects import postgresql
+
+class UUIDType(TypeDecorator):
+    """UUID column: native `uuid` on Postgres, 16-byte BINARY elsewhere.
+
+    Python side always sees the canonical string form, so the JSON API and
+    existing `filter_by(uuid=...)` lookups are unchanged.
+    """
+    impl = BINARY(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=True))
+        return dialect.type_descriptor(BINARY(16))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if not isinstance(value, uuid.UUID):
+            try:
+                value = uuid.UUID(str(value))
+            except ValueError:
+                # Malformed ids can't match any row; compare against NULL instead of erroring
+                return None
+        return value if dialect.name == 'postgresql' else value.bytes
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, uuid.UUID):
+            return str(value)
+        return str(uuid.UUID(bytes=bytes(value)))
@@ -0,0 +1,59 @@
+# Gunicorn configuration: gunicorn -c gunicorn.conf.py app:app
+#
+# GUNICORN_WORKER_CLASS=sync (default) runs one request at a time per process.
+# GUNICORN_WORKER_CLASS=gevent runs many requests per process as greenlets;
+# Flask contexts and the Flask-SQLAlchemy session are context-local, so each
+# greenlet gets its own session, and JWT/CORS only read per-request state.
+# CPU-bound work is pushed to native threads by utils.offload.
+import multiprocessing
+import os
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+# Mirrors SQLALCHEMY_ENGINE_OPTIONS in app.py
+db_pool_size = int(os.environ.get('DB_POOL_SIZE', 5))
+db_max_overflow = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+
+if worker_class == 'gevent':
+    # One process per core; concurrency comes from greenlets
+    workers = int(os.environ.get('GUNICORN_WORKERS', cpu_count))
+    # Each in-flight request holds at most one DB connection. Allow some
+    # headroom for requests that never touch the DB (health, QR rejects);
+    # beyond this, requests queue in the listen backlog instead of the pool.
+    worker_connections = int(os.environ.get(
+        'GUNICORN_WORKER_CONNECTIONS',
+        (db_pool_size + db_max_overflow) * 2
+    ))
+else:
+    workers = int(os.environ.get('GUNICORN_WORKERS', cpu_count * 2 + 1))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        # psycopg2 blocks the whole process unless made cooperative
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            server.log.warning("psycogreen not installed; Postgres calls will block the gevent loop")
+
+def on_starting(server):
+    # Create upcoming medical_history partitions once in the master, not in every worker
+    if os.environ.get('HISTORY_PARTITIONING', 'false').lower() != 'true':
+        return
+    from sqlalchemy import create_engine
+    from utils.partitions import ensure_partitions
+
+    engine = create_engine(os.environ['DATABASE_URL'])
+    try:
+        with engine.begin() as conn:
+            ensure_partitions(conn, years_ahead=int(os.environ.get('HISTORY_PARTITION_YEARS_AHEAD', 1)))
+    except Exception as e:
+        # Rows for a missing year land in medical_history_default and are moved later
+        server.log.error(f"Could not ensure medical_history partitions: {e}")
+    finally:
+        engine.dispose()
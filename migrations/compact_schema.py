@@ -0,0 +1,98 @@
+"""Convert an existing Postgres database to the compact schema.
+
+- users.uuid: VARCHAR(36) -> native uuid
+- medical_history.test_type: free text -> test_type_id referencing test_types
+
+Prints table and index sizes before and after. Run from the repo root:
+
+    python -m migrations.compact_schema [--vacuum-full]
+
+--vacuum-full rewrites medical_history so the dropped column's space is
+actually reclaimed (takes an exclusive lock).
+"""
+import sys
+from sqlalchemy import text
+from app import app
+from extensions import db
+
+TABLES = ['users', 'medical_history', 'test_types']
+
+SIZES_SQL = text("""
+    SELECT c.relname,
+           pg_relation_size(c.oid) AS table_bytes,
+           pg_indexes_size(c.oid) AS index_bytes
+    FROM pg_class c
+    WHERE c.relname = ANY(:tables) AND c.relkind = 'r'
+    ORDER BY c.relname
+""")
+
+MIGRATION_SQL = [
+    # test_types is normally created by db.create_all() on app start
+    """
+    CREATE TABLE IF NOT EXISTS test_types (
+        id SMALLSERIAL PRIMARY KEY,
+        key VARCHAR(255) NOT NULL UNIQUE,
+        name VARCHAR(255) NOT NULL
+    )
+    """,
+    # Same canonicalization as TestType.canonicalize: collapse whitespace, lowercase key.
+    # The display name is the spelling first written, i.e. on the lowest-id entry.
+    """
+    INSERT INTO test_types (key, name)
+    SELECT DISTINCT ON (lower(canon)) lower(canon), canon
+    FROM (
+        SELECT id, regexp_replace(btrim(test_type), '\\s+', ' ', 'g') AS canon
+        FROM medical_history
+    ) t
+    ORDER BY lower(canon), id
+    ON CONFLICT (key) DO NOTHING
+    """,
+    "ALTER TABLE medical_history ADD COLUMN test_type_id SMALLINT REFERENCES test_types (id)",
+    """
+    UPDATE medical_history mh
+    SET test_type_id = tt.id
+    FROM test_types tt
+    WHERE tt.key = lower(regexp_replace(btrim(mh.test_type), '\\s+', ' ', 'g'))
+    """,
+    "ALTER TABLE medical_history ALTER COLUMN test_type_id SET NOT NULL",
+    "ALTER TABLE medical_history DROP COLUMN test_type",
+    "ALTER TABLE users ALTER COLUMN uuid TYPE uuid USING uuid::uuid",
+]
+
+def print_sizes(conn, label):
+    print(f"\n{label}")
+    print(f"{'table':<18} {'table bytes':>14} {'index bytes':>14}")
+    for row in conn.execute(SIZES_SQL, {'tables': TABLES}):
+        print(f"{row.relname:<18} {row.table_bytes:>14,} {row.index_bytes:>14,}")
+
+def already_migrated(conn):
+    return conn.execute(text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'medical_history' AND column_name = 'test_type_id'
+    """)).first() is not None
+
+def main():
+    vacuum_full = '--vacuum-full' in sys.argv
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != 'postgresql':
+            sys.exit("This migration targets Postgres; other backends get the new schema from db.create_all()")
+
+        with engine.begin() as conn:
+            if already_migrated(conn):
+                print("Schema already migrated")
+                return
+            print_sizes(conn, "Before")
+            for statement in MIGRATION_SQL:
+                conn.execute(text(statement))
+
+        if vacuum_full:
+            with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                conn.execute(text("VACUUM FULL medical_history"))
+
+        with engine.connect() as conn:
+            print_sizes(conn, "After")
+
+if __name__ == '__main__':
+    main()
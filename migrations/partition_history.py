@@ -0,0 +1,80 @@
+"""Convert medical_history into a table range-partitioned by entry_date (Postgres 12+).
+
+Run from the repo root, during a maintenance window, after
+migrations.compact_schema (the new table references test_types):
+
+    python -m migrations.partition_history [--keep-old]
+
+Postgres requires the partition key in every unique constraint, so the
+primary key becomes (id, entry_date). amendments.medical_history_id can no
+longer be a database-level foreign key; the ORM relationship is unchanged.
+Afterwards set HISTORY_PARTITIONING=true so future partitions are created
+when gunicorn starts, and run `flask history ensure-partitions` from cron.
+"""
+import sys
+from sqlalchemy import text
+from app import app
+from extensions import db
+from utils.partitions import is_partitioned, ensure_partitions
+
+def main():
+    keep_old = '--keep-old' in sys.argv
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != 'postgresql':
+            sys.exit("Partitioning is only supported on Postgres")
+
+        with engine.begin() as conn:
+            if is_partitioned(conn):
+                print("medical_history is already partitioned")
+                return
+            if conn.execute(text("""
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'medical_history' AND column_name = 'test_type_id'
+            """)).first() is None:
+                sys.exit("Run `python -m migrations.compact_schema` first")
+
+            first_year = conn.execute(text(
+                "SELECT COALESCE(EXTRACT(YEAR FROM min(entry_date))::int, EXTRACT(YEAR FROM now())::int) FROM medical_history"
+            )).scalar()
+
+            for statement in [
+                "LOCK TABLE medical_history IN ACCESS EXCLUSIVE MODE",
+                "ALTER TABLE amendments DROP CONSTRAINT IF EXISTS amendments_medical_history_id_fkey",
+                "ALTER TABLE medical_history RENAME TO medical_history_unpartitioned",
+                """
+                CREATE TABLE medical_history (LIKE medical_history_unpartitioned INCLUDING DEFAULTS)
+                PARTITION BY RANGE (entry_date)
+                """,
+                "ALTER TABLE medical_history ADD PRIMARY KEY (id, entry_date)",
+                "ALTER TABLE medical_history ADD FOREIGN KEY (user_id) REFERENCES users (id)",
+                "ALTER TABLE medical_history ADD FOREIGN KEY (doctor_id) REFERENCES doctors (id)",
+                "ALTER TABLE medical_history ADD FOREIGN KEY (test_type_id) REFERENCES test_types (id)",
+                # Keep the id sequence alive when the old table is dropped
+                "ALTER SEQUENCE medical_history_id_seq OWNED BY medical_history.id",
+            ]:
+                conn.execute(text(statement))
+
+            ensure_partitions(conn, years_ahead=1, first_year=first_year)
+
+            conn.execute(text("INSERT INTO medical_history SELECT * FROM medical_history_unpartitioned"))
+
+            if keep_old:
+                # Free the index names for the partitioned table
+                for index in ('ix_medical_history_doctor_recent', 'ix_medical_history_user_recent'):
+                    conn.execute(text(f"ALTER INDEX IF EXISTS {index} RENAME TO {index}_old"))
+            else:
+                conn.execute(text("DROP TABLE medical_history_unpartitioned"))
+
+            conn.execute(text(
+                "CREATE INDEX ix_medical_history_doctor_recent ON medical_history (doctor_id, entry_date, id)"
+            ))
+            conn.execute(text(
+                "CREATE INDEX ix_medical_history_user_recent ON medical_history (user_id, entry_date)"
+            ))
+
+        print(f"medical_history partitioned by year from {first_year}")
+
+if __name__ == '__main__':
+    main()
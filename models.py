@@ -1,13 +1,19 @@
 from extensions import db
+from db_types import UUIDType
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 import uuid
 import json
+import zlib
+
+# Test type ids fit in SMALLINT; SQLite only autoincrements INTEGER PRIMARY KEY
+SmallId = db.SmallInteger().with_variant(db.Integer, 'sqlite')
 
 class User(db.Model):
     __tablename__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True)
-    uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    uuid = db.Column(UUIDType, unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     first_name = db.Column(db.String(120), nullable=False)
@@ -21,19 +27,36 @@ class User(db.Model):
     
     medical_history = db.relationship('MedicalHistory', backref='user', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'uuid': self.uuid,
-            'email': self.email,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'phone': self.phone,
-            'date_of_birth': self.date_of_birth.isoformat() if self.date_of_birth else None,
-            'gender': self.gender,
-            'address': self.address,
-            'created_at': self.created_at.isoformat()
+    # Serializable field -> columns that must be loaded to produce it (see utils/fields.py)
+    FIELD_COLUMNS = {
+        'id': ('id',),
+        'uuid': ('uuid',),
+        'email': ('email',),
+        'first_name': ('first_name',),
+        'last_name': ('last_name',),
+        'phone': ('phone',),
+        'date_of_birth': ('date_of_birth',),
+        'gender': ('gender',),
+        'address': ('address',),
+        'created_at': ('created_at',),
+    }
+    ALWAYS_FIELDS = ('uuid',)
+    
+    def to_dict(self, fields=None):
+        data = {
+            'id': lambda: self.id,
+            'uuid': lambda: self.uuid,
+            'email': lambda: self.email,
+            'first_name': lambda: self.first_name,
+            'last_name': lambda: self.last_name,
+            'phone': lambda: self.phone,
+            'date_of_birth': lambda: self.date_of_birth.isoformat() if self.date_of_birth else None,
+            'gender': lambda: self.gender,
+            'address': lambda: self.address,
+            'created_at': lambda: self.created_at.isoformat()
         }
+        # Only touch requested attributes so deferred columns are never lazy-loaded
+        return {k: v() for k, v in data.items() if fields is None or k in fields}
 
 class Doctor(db.Model):
     __tablename__ = 'doctors'
@@ -66,14 +89,65 @@ class Doctor(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+class TestType(db.Model):
+    __tablename__ = 'test_types'
+    
+    id = db.Column(SmallId, primary_key=True)
+    key = db.Column(db.String(255), unique=True, nullable=False)  # canonical lowercase form
+    name = db.Column(db.String(255), nullable=False)  # display form, as first written
+    
+    # Process-local key -> id cache; rows are never renamed or deleted
+    _id_cache = {}
+    
+    @staticmethod
+    def canonicalize(name):
+        display = ' '.join(str(name).split())
+        return display.lower(), display
+    
+    @classmethod
+    def id_for(cls, name):
+        """Id of an existing test type (case-insensitive), or None"""
+        key, _ = cls.canonicalize(name)
+        if key not in cls._id_cache:
+            test_type_id = db.session.query(cls.id).filter_by(key=key).scalar()
+            if test_type_id is None:
+                return None
+            cls._id_cache[key] = test_type_id
+        return cls._id_cache[key]
+    
+    @classmethod
+    def get_or_create(cls, name):
+        key, display = cls.canonicalize(name)
+        test_type = cls.query.filter_by(key=key).first()
+        if test_type:
+            return test_type
+        
+        try:
+            # Savepoint so a concurrent insert of the same key doesn't abort the caller's transaction
+            with db.session.begin_nested():
+                test_type = cls(key=key, name=display)
+                db.session.add(test_type)
+        except IntegrityError:
+            # Only a concurrent insert of the same key is expected here; anything else is a real error
+            test_type = cls.query.filter_by(key=key).first()
+            if test_type is None:
+                raise
+        return test_type
+
 class MedicalHistory(db.Model):
     __tablename__ = 'medical_history'
+    __table_args__ = (
+        # Doctor worklist: WHERE doctor_id = ? ORDER BY entry_date DESC, id DESC
+        db.Index('ix_medical_history_doctor_recent', 'doctor_id', 'entry_date', 'id'),
+        # Patient history: WHERE user_id = ? ORDER BY entry_date
+        db.Index('ix_medical_history_user_recent', 'user_id', 'entry_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
     entry_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    test_type = db.Column(db.String(255), nullable=False)
+    test_type_id = db.Column(SmallId, db.ForeignKey('test_types.id'), nullable=False)
     test_results = db.Column(db.Text)
     diagnosis = db.Column(db.Text)
     prescription = db.Column(db.Text)
@@ -83,24 +157,48 @@ class MedicalHistory(db.Model):
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     amendments = db.relationship('Amendment', backref='medical_entry', lazy=True, cascade='all, delete-orphan')
+    test_type_ref = db.relationship('TestType', lazy='joined')
+    
+    @property
+    def test_type(self):
+        return self.test_type_ref.name if self.test_type_ref else None
+    
+    # Serializable field -> columns that must be loaded to produce it (see utils/fields.py)
+    FIELD_COLUMNS = {
+        'id': ('id',),
+        'test_type': ('test_type_id',),
+        'test_results': ('test_results',),
+        'diagnosis': ('diagnosis',),
+        'prescription': ('prescription',),
+        'notes': ('notes',),
+        'is_amended': ('is_amended',),
+        'entry_date': ('entry_date',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+        'doctor': ('doctor_id',),
+        'amendments': (),
+    }
+    ALWAYS_FIELDS = ('id',)
     
-    def to_dict(self, include_amendments=True):
+    def to_dict(self, include_amendments=True, fields=None):
         data = {
-            'id': self.id,
-            'test_type': self.test_type,
-            'test_results': self.test_results,
-            'diagnosis': self.diagnosis,
-            'prescription': self.prescription,
-            'notes': self.notes,
-            'is_amended': self.is_amended,
-            'entry_date': self.entry_date.isoformat(),
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'doctor': self.doctor.to_dict() if self.doctor else None
+            'id': lambda: self.id,
+            'test_type': lambda: self.test_type,
+            'test_results': lambda: self.test_results,
+            'diagnosis': lambda: self.diagnosis,
+            'prescription': lambda: self.prescription,
+            'notes': lambda: self.notes,
+            'is_amended': lambda: self.is_amended,
+            'entry_date': lambda: self.entry_date.isoformat(),
+            'created_at': lambda: self.created_at.isoformat(),
+            'updated_at': lambda: self.updated_at.isoformat(),
+            'doctor': lambda: self.doctor.to_dict() if self.doctor else None
         }
-        if include_amendments and self.amendments:
-            data['amendments'] = [a.to_dict() for a in self.amendments]
-        return data
+        # Only touch requested attributes so deferred columns are never lazy-loaded
+        result = {k: v() for k, v in data.items() if fields is None or k in fields}
+        if include_amendments and (fields is None or 'amendments' in fields) and self.amendments:
+            result['amendments'] = [a.to_dict() for a in self.amendments]
+        return result
 
 class Amendment(db.Model):
     __tablename__ = 'amendments'
@@ -122,3 +220,148 @@ class Amendment(db.Model):
             'amended_data': json.loads(self.amended_data),
             'doctor': self.doctor.to_dict() if self.doctor else None
         }
+
+
+class ArchivedHistory(db.Model):
+    """Cold-tier copy of a MedicalHistory entry, moved by utils/archive.py.
+
+    Keeps the original id and the filter/sort columns; the free-text fields
+    and amendments (with their doctor, as of archiving) are stored as
+    zlib-compressed JSON.
+    """
+    __tablename__ = 'medical_history_archive'
+    __table_args__ = (
+        db.Index('ix_medical_history_archive_user_recent', 'user_id', 'entry_date'),
+        db.Index('ix_medical_history_archive_doctor_recent', 'doctor_id', 'entry_date', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
+    test_type_id = db.Column(SmallId, db.ForeignKey('test_types.id'), nullable=False)
+    entry_date = db.Column(db.DateTime, nullable=False)
+    is_amended = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    user = db.relationship('User')
+    doctor = db.relationship('Doctor')
+    test_type_ref = db.relationship('TestType', lazy='joined')
+    
+    PAYLOAD_FIELDS = ('test_results', 'diagnosis', 'prescription', 'notes')
+    
+    # Same field names as MedicalHistory so fields= projections apply unchanged
+    FIELD_COLUMNS = {
+        'id': ('id',),
+        'test_type': ('test_type_id',),
+        'test_results': ('payload',),
+        'diagnosis': ('payload',),
+        'prescription': ('payload',),
+        'notes': ('payload',),
+        'is_amended': ('is_amended',),
+        'entry_date': ('entry_date',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+        'doctor': ('doctor_id',),
+        'amendments': ('payload',),
+    }
+    ALWAYS_FIELDS = ('id',)
+    
+    @property
+    def test_type(self):
+        return self.test_type_ref.name if self.test_type_ref else None
+    
+    @classmethod
+    def from_entry(cls, entry):
+        content = {f: getattr(entry, f) for f in cls.PAYLOAD_FIELDS}
+        content['amendments'] = [a.to_dict() for a in entry.amendments]
+        return cls(
+            id=entry.id,
+            user_id=entry.user_id,
+            doctor_id=entry.doctor_id,
+            test_type_id=entry.test_type_id,
+            entry_date=entry.entry_date,
+            is_amended=entry.is_amended,
+            created_at=entry.created_at,
+            updated_at=entry.updated_at,
+            payload=zlib.compress(json.dumps(content).encode('utf-8'), 9)
+        )
+    
+    def to_dict(self, include_amendments=True, fields=None):
+        content = {}
+        if fields is None or any(self.FIELD_COLUMNS[f] == ('payload',) for f in fields):
+            content = json.loads(zlib.decompress(self.payload))
+        
+        data = {
+            'id': lambda: self.id,
+            'test_type': lambda: self.test_type,
+            'test_results': lambda: content.get('test_results'),
+            'diagnosis': lambda: content.get('diagnosis'),
+            'prescription': lambda: content.get('prescription'),
+            'notes': lambda: content.get('notes'),
+            'is_amended': lambda: self.is_amended,
+            'entry_date': lambda: self.entry_date.isoformat(),
+            'created_at': lambda: self.created_at.isoformat(),
+            'updated_at': lambda: self.updated_at.isoformat(),
+            'doctor': lambda: self.doctor.to_dict() if self.doctor else None
+        }
+        result = {k: v() for k, v in data.items() if fields is None or k in fields}
+        if include_amendments and (fields is None or 'amendments' in fields) and content.get('amendments'):
+            result['amendments'] = content['amendments']
+        return result
+
+class Job(db.Model):
+    """Background job; claimed and run by the `flask jobs worker` process pool (utils/jobs.py)"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_claim', 'status', 'run_after'),
+    )
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    job_type = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False)  # JSON string
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed, expired
+    owner_role = db.Column(db.String(10), nullable=False)
+    owner_id = db.Column(db.Integer, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    error = db.Column(db.Text)
+    result_path = db.Column(db.String(500))
+    result_mimetype = db.Column(db.String(100))
+    result_filename = db.Column(db.String(255))
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+    worker_id = db.Column(db.String(255))  # '<host>:<pid>' of the worker running it
+    heartbeat_at = db.Column(db.DateTime)  # refreshed by that worker while running
+    
+    @property
+    def is_expired(self):
+        # expire_results runs periodically; the TTL applies as soon as it passes
+        return self.status == 'expired' or (self.expires_at is not None and self.expires_at < datetime.utcnow())
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.job_type,
+            'status': 'expired' if self.is_expired else self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+
+class ThrottleBucket(db.Model):
+    """Login token bucket shared by all worker processes (utils/admission.py)"""
+    __tablename__ = 'throttle_buckets'
+    
+    key = db.Column(db.String(255), primary_key=True)  # '<scope>:<account or IP>'
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True)
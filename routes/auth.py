@@ -4,6 +4,7 @@ from flask_jwt_extended import create_access_token
 from app import db
 from models import User, Doctor
 from utils.auth import hash_password, verify_password
+from utils.admission import cost_class, login_throttle
 import logging
 from datetime import datetime
 
@@ -11,6 +12,7 @@ auth_bp = Blueprint('auth', __name__)
 logger = logging.getLogger(__name__)
 
 @auth_bp.route('/user/signup', methods=['POST'])
+@cost_class('kdf')
 def user_signup():
     try:
         data = request.get_json()
@@ -61,6 +63,8 @@ def user_signup():
         return jsonify({'message': 'Internal server error'}), 500
 
 @auth_bp.route('/user/login', methods=['POST'])
+@login_throttle
+@cost_class('kdf')
 def user_login():
     try:
         data = request.get_json()
@@ -96,6 +100,7 @@ def user_login():
         return jsonify({'message': 'Internal server error'}), 500
 
 @auth_bp.route('/doctor/signup', methods=['POST'])
+@cost_class('kdf')
 def doctor_signup():
     try:
         data = request.get_json()
@@ -138,6 +143,8 @@ def doctor_signup():
         return jsonify({'message': 'Internal server error'}), 500
 
 @auth_bp.route('/doctor/login', methods=['POST'])
+@login_throttle
+@cost_class('kdf')
 def doctor_login():
     try:
         data = request.get_json()
@@ -1,21 +1,58 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
 from app import db
-from models import User, Doctor, MedicalHistory, Amendment
+from models import User, Doctor, MedicalHistory, Amendment, TestType, ArchivedHistory
 from utils.auth import require_role, get_current_user_info
+from utils.fields import parse_fields, load_options, history_load_options, archive_load_options
+from utils.archive import merge_history
+from utils.export import export_response, parse_export_cursor
+from utils.qrcode_gen import decode_qr_image
+from utils.qr_token import decode_qr_payload
+from utils.pagination import encode_cursor, decode_cursor
+from utils.admission import cost_class
+from utils.card_batch import BATCH_FORMATS, load_card_items, card_batch_chunks
+from sqlalchemy import func, distinct, tuple_, select, union_all
+from sqlalchemy.orm import selectinload
 import logging
 import json
-from datetime import datetime
-import base64
-from PIL import Image
-from io import BytesIO
-import qrcode
-from PIL import Image, ImageEnhance # Essential import
-from pyzbar.pyzbar import decode
+from operator import attrgetter
+from datetime import datetime, timedelta
 
 doctor_bp = Blueprint('doctor', __name__)
 logger = logging.getLogger(__name__)
 
+def _history_page(user_id, load_fields, limit, cursor=None):
+    """One keyset page of a patient's history, newest first, across live and archived entries.
+
+    Returns (entries, next_cursor); next_cursor is None on the last page.
+    """
+    def page_query(model, options):
+        query = (
+            model.query
+            .filter(model.user_id == user_id)
+            .options(*options)
+            .order_by(model.entry_date.desc(), model.id.desc())
+        )
+        if cursor:
+            query = query.filter(tuple_(model.entry_date, model.id) < cursor)
+        return query
+
+    # Fetch one extra row to know whether more pages exist
+    entries = page_query(MedicalHistory, history_load_options(load_fields)).limit(limit + 1).all()
+    if len(entries) <= limit:
+        # Page reaches past the live tier; archived entries keep their ids, so the cursor applies
+        entries = merge_history(
+            entries,
+            page_query(ArchivedHistory, archive_load_options(load_fields)).limit(limit + 1 - len(entries)).all(),
+            key=attrgetter('entry_date', 'id'),
+            reverse=True
+        )
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    next_cursor = encode_cursor(entries[-1].entry_date, entries[-1].id) if has_more else None
+    return entries, next_cursor
+
 @doctor_bp.route('/add-medical-history', methods=['POST'])
 @require_role('doctor')
 def add_medical_history():
@@ -35,7 +72,7 @@ def add_medical_history():
         medical_entry = MedicalHistory(
             user_id=user.id,
             doctor_id=doctor_id,
-            test_type=data['test_type'],
+            test_type_ref=TestType.get_or_create(data['test_type']),
             test_results=data.get('test_results'),
             diagnosis=data.get('diagnosis'),
             prescription=data.get('prescription'),
@@ -66,6 +103,8 @@ def amend_medical_history(entry_id):
         
         entry = MedicalHistory.query.get(entry_id)
         if not entry:
+            if ArchivedHistory.query.get(entry_id):
+                return jsonify({'message': 'Archived entries cannot be amended'}), 409
             return jsonify({'message': 'Medical entry not found'}), 404
         
         # Store original data
@@ -130,7 +169,13 @@ def query_user_by_uuid():
         if not data or 'user_uuid' not in data:
             return jsonify({'message': 'Missing user_uuid'}), 400
         
-        user = User.query.filter_by(uuid=data['user_uuid']).first()
+        # Projection may come from the body or the query string
+        try:
+            fields = parse_fields(data.get('fields') or request.args.get('fields'), User)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        user = User.query.options(*load_options(User, fields)).filter_by(uuid=data['user_uuid']).first()
         if not user:
             logger.warning(f"Doctor {doctor_info['doctor_id']} queried non-existent user: {data['user_uuid']}")
             return jsonify({'message': 'User not found'}), 404
@@ -139,7 +184,7 @@ def query_user_by_uuid():
         
         return jsonify({
             'message': 'User information retrieved',
-            'user': user.to_dict()
+            'user': user.to_dict(fields=fields)
         }), 200
     except Exception as e:
         logger.error(f"Error querying user: {str(e)}")
@@ -152,24 +197,47 @@ def get_user_medical_history(user_uuid):
         doctor_info = get_current_user_info()
         doctor_id = doctor_info['doctor_id']
         
+        try:
+            fields = parse_fields(request.args.get('fields'), MedicalHistory)
+            cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
         user = User.query.filter_by(uuid=user_uuid).first()
         if not user:
             logger.warning(f"Doctor {doctor_id} requested history for non-existent user: {user_uuid}")
             return jsonify({'message': 'User not found'}), 404
         
-        # Fetch all medical history entries for this user
-        history = MedicalHistory.query.filter_by(user_id=user.id).all()
+        load_fields = fields | {'entry_date'} if fields is not None else None
+        paged = cursor is not None or 'limit' in request.args
+        if paged:
+            # Keyset pages, e.g. continuing from scan-and-fetch's next_cursor
+            limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+            history, next_cursor = _history_page(user.id, load_fields, limit, cursor)
+        else:
+            # Fetch all medical history entries for this user (live and archived), newest first
+            next_cursor = None
+            history = merge_history(
+                MedicalHistory.query
+                .filter_by(user_id=user.id)
+                .options(*history_load_options(load_fields))
+                .order_by(MedicalHistory.entry_date.desc())
+                .all(),
+                ArchivedHistory.query
+                .filter_by(user_id=user.id)
+                .options(*archive_load_options(load_fields))
+                .order_by(ArchivedHistory.entry_date.desc())
+                .all(),
+                key=attrgetter('entry_date'),
+                reverse=True
+            )
         
         # Convert to list of dicts
-        history_data = [entry.to_dict() for entry in history]
-        
-        # Sort by entry_date descending (newest first)
-        # Note: sorting in python to avoid circular import or db specific issues if models not imported with desc
-        history_data.sort(key=lambda x: x.get('entry_date', '') or '', reverse=True)
+        history_data = [entry.to_dict(fields=fields) for entry in history]
 
         logger.info(f"Doctor {doctor_id} retrieved medical history for user: {user.uuid}")
         
-        return jsonify({
+        result = {
             'message': 'User medical history retrieved',
             'count': len(history_data),
             'data': history_data,
@@ -178,57 +246,296 @@ def get_user_medical_history(user_uuid):
                 'last_name': user.last_name,
                 'uuid': user.uuid
             }
-        }), 200
+        }
+        if paged:
+            result['next_cursor'] = next_cursor
+        return jsonify(result), 200
     except Exception as e:
         logger.error(f"Error retrieving user history: {str(e)}")
         return jsonify({'message': 'Internal server error'}), 500
 
+@doctor_bp.route('/export/<user_uuid>', methods=['GET'])
+@require_role('doctor')
+def export_user_record(user_uuid):
+    try:
+        doctor_info = get_current_user_info()
+        doctor_id = doctor_info['doctor_id']
+        
+        user = User.query.filter_by(uuid=user_uuid).first()
+        if not user:
+            logger.warning(f"Doctor {doctor_id} requested export for non-existent user: {user_uuid}")
+            return jsonify({'message': 'User not found'}), 404
+        
+        try:
+            cursor = parse_export_cursor(request.args.get('cursor'))
+            response = export_response(
+                user,
+                fmt=request.args.get('format', 'ndjson'),
+                cursor=cursor,
+                compress=request.args.get('gzip', '').lower() in ('1', 'true')
+            )
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        logger.info(f"Doctor {doctor_id} started record export for user: {user.uuid}, cursor: {cursor}")
+        
+        return response
+    except Exception as e:
+        logger.error(f"Error exporting user record: {str(e)}")
+        return jsonify({'message': 'Internal server error'}), 500
+
 @doctor_bp.route('/scan-qr-code', methods=['POST'])
 @require_role('doctor')
+@cost_class('decode')
 def scan_qr_code():
     try:
         if 'qr_image' not in request.files:
             return jsonify({'message': 'No QR image provided'}), 400
         
-        file = request.files['qr_image']
+        qr_data = decode_qr_image(request.files['qr_image'].stream)
+        if not qr_data:
+            return jsonify({'message': 'Could not decode QR code'}), 400
         
-        # 1. Open Image with PIL (Standard, lightweight)
-        image = Image.open(file.stream)
+        # Reject forged/malformed cards before anything touches the DB
+        try:
+            user_uuid = decode_qr_payload(qr_data)
+        except ValueError as e:
+            logger.warning(f"Rejected QR payload: {str(e)}")
+            return jsonify({'message': 'Invalid QR code'}), 400
         
-        # 2. OPTIMIZATION: Pre-process for "Noisy" Backgrounds
-        # Convert to Greyscale (removes color noise)
-        image = image.convert('L') 
+        return jsonify({
+            'message': 'QR code scanned successfully',
+            'user_uuid': user_uuid
+        }), 200
+
+    except ImportError:
+        logger.error("pyzbar library not installed")
+        return jsonify({'message': 'Server configuration error'}), 503
+    except Exception as e:
+        logger.error(f"Error scanning QR: {str(e)}")
+        return jsonify({'message': 'Internal server error'}), 500
+
+@doctor_bp.route('/scan-and-fetch', methods=['POST'])
+@require_role('doctor')
+@cost_class('decode')
+def scan_and_fetch():
+    """Decode + verify a QR card and return profile and first history page in one call"""
+    try:
+        doctor_info = get_current_user_info()
+        doctor_id = doctor_info['doctor_id']
         
-        # Increase Contrast (helps the black QR squares pop out from a messy desk/background)
-        enhancer = ImageEnhance.Contrast(image)
-        image = enhancer.enhance(2.0)  # Double the contrast
+        # Accept either the card image or text already decoded by a handheld scanner
+        if 'qr_image' in request.files:
+            qr_data = decode_qr_image(request.files['qr_image'].stream)
+        else:
+            qr_data = request.form.get('qr_data') or (request.get_json(silent=True) or {}).get('qr_data')
+        
+        if not qr_data:
+            return jsonify({'message': 'No decodable QR code provided'}), 400
+        if not isinstance(qr_data, str):
+            return jsonify({'message': 'qr_data must be a string'}), 400
+        
+        try:
+            user_uuid = decode_qr_payload(qr_data)
+        except ValueError as e:
+            logger.warning(f"Doctor {doctor_id} presented rejected QR payload: {str(e)}")
+            return jsonify({'message': 'Invalid QR code'}), 400
+        
+        try:
+            user_fields = parse_fields(request.args.get('user_fields'), User)
+            history_fields = parse_fields(request.args.get('fields'), MedicalHistory)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        
+        user = User.query.options(*load_options(User, user_fields)).filter_by(uuid=user_uuid).first()
+        if not user:
+            logger.warning(f"Doctor {doctor_id} scanned card for non-existent user: {user_uuid}")
+            return jsonify({'message': 'User not found'}), 404
         
-        # 3. Decode
-        decoded_objects = decode(image)
+        load_fields = history_fields | {'entry_date'} if history_fields is not None else None
+        history, next_cursor = _history_page(user.id, load_fields, limit)
         
-        if not decoded_objects:
-            # Fallback: Try sharpening if contrast didn't work (optional but helpful)
-            from PIL import ImageFilter
-            image = image.filter(ImageFilter.SHARPEN)
-            decoded_objects = decode(image)
-
-        if not decoded_objects:
-            return jsonify({'message': 'Could not decode QR code'}), 400
-
-        # ... (Rest of your logic remains the same)
-        uuid_data = decoded_objects[0].data.decode('utf-8')
-        # ...
+        logger.info(f"Doctor {doctor_id} scanned and fetched record for user: {user.uuid}")
         
         return jsonify({
-            'message': 'QR code scanned successfully',
-            'user_uuid': uuid_data
+            'message': 'User record retrieved',
+            'user': user.to_dict(fields=user_fields),
+            'count': len(history),
+            'has_more': next_cursor is not None,
+            # Pass as `cursor` to /user-medical-history/<uuid> for the following pages
+            'next_cursor': next_cursor,
+            'data': [entry.to_dict(fields=history_fields) for entry in history]
         }), 200
 
     except ImportError:
         logger.error("pyzbar library not installed")
         return jsonify({'message': 'Server configuration error'}), 503
     except Exception as e:
-        logger.error(f"Error scanning QR: {str(e)}")
+        logger.error(f"Error in scan-and-fetch: {str(e)}")
+        return jsonify({'message': 'Internal server error'}), 500
+
+
+@doctor_bp.route('/cards/batch', methods=['POST'])
+@require_role('doctor')
+@cost_class('batch')
+def generate_card_batch():
+    """Render medical cards for a list of patients, streamed as a ZIP of PNGs or a multi-page PDF"""
+    try:
+        doctor_info = get_current_user_info()
+        doctor_id = doctor_info['doctor_id']
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('user_uuids'), list) or not data['user_uuids']:
+            return jsonify({'message': 'user_uuids must be a non-empty list'}), 400
+        
+        fmt = data.get('format', 'zip')
+        if fmt not in BATCH_FORMATS:
+            return jsonify({'message': f'Unsupported format: {fmt}'}), 400
+        
+        max_cards = current_app.config['CARD_BATCH_MAX']
+        if len(data['user_uuids']) > max_cards:
+            return jsonify({'message': f'At most {max_cards} cards per request; submit a render_cards job for larger batches'}), 400
+        
+        items, missing = load_card_items(data['user_uuids'])
+        if missing and not data.get('skip_missing'):
+            return jsonify({'message': 'Users not found', 'missing': missing}), 404
+        if not items:
+            return jsonify({'message': 'No users found'}), 404
+        
+        logger.info(f"Doctor {doctor_id} started batch card generation for {len(items)} users as {fmt}")
+        
+        chunks = card_batch_chunks(items, fmt, processes=current_app.config['CARD_RENDER_PROCESSES'])
+        return Response(
+            stream_with_context(chunks),
+            mimetype=BATCH_FORMATS[fmt],
+            headers={'Content-Disposition': f'attachment; filename=NexusAI_Cards.{fmt}'}
+        )
+    except Exception as e:
+        logger.error(f"Error generating card batch: {str(e)}")
+        return jsonify({'message': 'Internal server error'}), 500
+
+
+@doctor_bp.route('/worklist', methods=['GET'])
+@require_role('doctor')
+def get_worklist():
+    """Doctor's own entries (newest first, keyset paginated) with recent patients and counts"""
+    try:
+        doctor_info = get_current_user_info()
+        doctor_id = doctor_info['doctor_id']
+        
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        patients_limit = max(1, min(request.args.get('patients_limit', 10, type=int), 100))
+        test_type = request.args.get('test_type')
+        
+        try:
+            fields = parse_fields(request.args.get('fields'), MedicalHistory)
+            cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+            date_from = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else None
+            date_to = datetime.strptime(request.args['to'], '%Y-%m-%d') if request.args.get('to') else None
+        except ValueError as e:
+            return jsonify({'message': f'Invalid parameter: {str(e)}'}), 400
+        
+        def tier_filters(model):
+            filters = [model.doctor_id == doctor_id]
+            if test_type:
+                filters.append(model.test_type_id == TestType.id_for(test_type))
+            if date_from:
+                filters.append(model.entry_date >= date_from)
+            if date_to:
+                # Inclusive of the whole 'to' day
+                filters.append(model.entry_date < date_to + timedelta(days=1))
+            if cursor:
+                filters.append(tuple_(model.entry_date, model.id) < cursor)
+            return filters
+        
+        # Entries page: walks ix_medical_history_doctor_recent backwards from the cursor.
+        # entry_date is always loaded since the next cursor is built from it.
+        load_fields = fields | {'entry_date'} if fields is not None else None
+        def patient(model):
+            return selectinload(model.user).load_only(User.uuid, User.first_name, User.last_name)
+        
+        entries = (
+            MedicalHistory.query
+            .filter(*tier_filters(MedicalHistory))
+            .options(*history_load_options(load_fields), patient(MedicalHistory))
+            .order_by(MedicalHistory.entry_date.desc(), MedicalHistory.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        if len(entries) <= limit:
+            # Page reaches past the live tier; archived entries keep their ids, so the cursor applies
+            entries = merge_history(
+                entries,
+                ArchivedHistory.query
+                .filter(*tier_filters(ArchivedHistory))
+                .options(*archive_load_options(load_fields), patient(ArchivedHistory))
+                .order_by(ArchivedHistory.entry_date.desc(), ArchivedHistory.id.desc())
+                .limit(limit + 1 - len(entries))
+                .all(),
+                key=attrgetter('entry_date', 'id'),
+                reverse=True
+            )
+        
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1].entry_date, entries[-1].id) if has_more else None
+        
+        data = []
+        for entry in entries:
+            item = entry.to_dict(fields=fields)
+            item['user'] = {
+                'uuid': entry.user.uuid,
+                'first_name': entry.user.first_name,
+                'last_name': entry.user.last_name
+            }
+            data.append(item)
+        
+        # Distinct recent patients and counts only on the first page, across both tiers
+        recent_patients = None
+        counts = None
+        if not cursor:
+            tiers = union_all(
+                select(MedicalHistory.user_id, MedicalHistory.entry_date).where(*tier_filters(MedicalHistory)),
+                select(ArchivedHistory.user_id, ArchivedHistory.entry_date).where(*tier_filters(ArchivedHistory))
+            ).subquery()
+            last_seen = func.max(tiers.c.entry_date).label('last_seen')
+            entry_count = func.count().label('entry_count')
+            rows = (
+                db.session.query(User.uuid, User.first_name, User.last_name, last_seen, entry_count)
+                .join(tiers, tiers.c.user_id == User.id)
+                .group_by(User.id, User.uuid, User.first_name, User.last_name)
+                .order_by(last_seen.desc())
+                .limit(patients_limit)
+                .all()
+            )
+            recent_patients = [{
+                'uuid': row.uuid,
+                'first_name': row.first_name,
+                'last_name': row.last_name,
+                'last_seen': row.last_seen.isoformat(),
+                'entry_count': row.entry_count
+            } for row in rows]
+            
+            total_entries, total_patients = (
+                db.session.query(func.count(), func.count(distinct(tiers.c.user_id)))
+                .select_from(tiers)
+                .one()
+            )
+            counts = {'entries': total_entries, 'patients': total_patients}
+        
+        logger.info(f"Worklist retrieved for doctor {doctor_id}")
+        
+        return jsonify({
+            'message': 'Worklist retrieved',
+            'count': len(data),
+            'data': data,
+            'next_cursor': next_cursor,
+            'recent_patients': recent_patients,
+            'counts': counts
+        }), 200
+    except Exception as e:
+        logger.error(f"Error retrieving worklist: {str(e)}")
         return jsonify({'message': 'Internal server error'}), 500
 
 
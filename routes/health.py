@@ -1,8 +1,18 @@
 #rote for health check
 from flask import Blueprint, jsonify
+from utils.admission import admission_metrics
+from utils.qr_token import unsigned_qr_metrics
 health_bp = Blueprint('health', __name__)
 @health_bp.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy'}), 200
 
-    
\ No newline at end of file
+@health_bp.route('/health/admission', methods=['GET'])
+def admission_status():
+    # Per cost-class in-flight/queue saturation and admit/reject counters
+    return jsonify({'classes': admission_metrics()}), 200
+
+@health_bp.route('/health/qr', methods=['GET'])
+def qr_status():
+    # Legacy unsigned cards still being scanned; zero for a while means QR_ALLOW_UNSIGNED can be disabled
+    return jsonify({'unsigned': unsigned_qr_metrics()}), 200
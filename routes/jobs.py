@@ -0,0 +1,89 @@
+import os
+from flask import Blueprint, request, jsonify, send_file, url_for
+from app import db
+from models import Job
+from utils.auth import require_role, get_current_user_info
+from utils.jobs import submit_job, owner_of
+import logging
+
+jobs_bp = Blueprint('jobs', __name__)
+logger = logging.getLogger(__name__)
+
+def _get_owned_job(job_id):
+    """Job by id if it belongs to the caller, else None"""
+    owner_role, owner_id = owner_of(get_current_user_info())
+    return Job.query.filter_by(id=job_id, owner_role=owner_role, owner_id=owner_id).first()
+
+@jobs_bp.route('', methods=['POST'])
+@require_role('user', 'doctor')
+def create_job():
+    try:
+        claims = get_current_user_info()
+        data = request.get_json()
+
+        if not isinstance(data, dict) or 'type' not in data:
+            return jsonify({'message': 'Missing job type'}), 400
+
+        try:
+            job = submit_job(data['type'], data.get('params'), claims)
+        except PermissionError as e:
+            return jsonify({'message': str(e)}), 403
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+
+        logger.info(f"Job {job.id} ({job.job_type}) submitted by {job.owner_role} {job.owner_id}")
+
+        return jsonify({
+            'message': 'Job submitted',
+            'job': job.to_dict(),
+            'status_url': url_for('jobs.get_job', job_id=job.id)
+        }), 202
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error submitting job: {str(e)}")
+        return jsonify({'message': 'Internal server error'}), 500
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@require_role('user', 'doctor')
+def get_job(job_id):
+    try:
+        job = _get_owned_job(job_id)
+        if not job:
+            return jsonify({'message': 'Job not found'}), 404
+
+        data = job.to_dict()
+        if job.status == 'succeeded' and not job.is_expired:
+            data['result_url'] = url_for('jobs.get_job_result', job_id=job.id)
+
+        return jsonify({
+            'message': 'Job retrieved',
+            'job': data
+        }), 200
+    except Exception as e:
+        logger.error(f"Error retrieving job: {str(e)}")
+        return jsonify({'message': 'Internal server error'}), 500
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+@require_role('user', 'doctor')
+def get_job_result(job_id):
+    try:
+        job = _get_owned_job(job_id)
+        if not job:
+            return jsonify({'message': 'Job not found'}), 404
+
+        if job.is_expired:
+            return jsonify({'message': 'Job result has expired'}), 410
+        if job.status != 'succeeded' or not job.result_path or not os.path.exists(job.result_path):
+            return jsonify({'message': f'Job result not available (status: {job.status})'}), 409
+
+        logger.info(f"Job {job.id} result downloaded by {job.owner_role} {job.owner_id}")
+
+        return send_file(
+            job.result_path,
+            mimetype=job.result_mimetype,
+            as_attachment=True,
+            download_name=job.result_filename
+        )
+    except Exception as e:
+        logger.error(f"Error serving job result: {str(e)}")
+        return jsonify({'message': 'Internal server error'}), 500
@@ -1,11 +1,17 @@
 from flask import Blueprint, send_file, jsonify, current_app, request
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
 from app import db
-from models import User, MedicalHistory
+from models import User, MedicalHistory, TestType, ArchivedHistory
 from utils.auth import require_role, get_current_user_info
 from utils.qrcode_gen import generate_qr_code, generate_user_card
+from utils.fields import parse_fields, load_options, history_load_options, archive_load_options
+from utils.archive import merge_history
+from utils.export import export_response, parse_export_cursor
+from utils.qr_token import encode_qr_payload
+from utils.admission import cost_class
 import logging
 import io
+from operator import attrgetter
 import base64
 user_bp = Blueprint('user', __name__)
 logger = logging.getLogger(__name__)
@@ -23,28 +29,42 @@ def get_medical_history():
         sort_by = request.args.get('sort_by', 'entry_date')  # entry_date or updated_at
         order = request.args.get('order', 'desc')  # asc or desc
         
-        query = MedicalHistory.query.filter_by(user_id=user_id)
-        
-        if test_type:
-            query = query.filter_by(test_type=test_type)
-        if doctor_id:
-            query = query.filter_by(doctor_id=doctor_id)
-        
-        # Apply sorting
-        sort_column = getattr(MedicalHistory, sort_by, MedicalHistory.entry_date)
-        if order.lower() == 'asc':
-            query = query.order_by(sort_column.asc())
-        else:
-            query = query.order_by(sort_column.desc())
-        
-        history = query.all()
+        try:
+            fields = parse_fields(request.args.get('fields'), MedicalHistory)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        if sort_by not in ('entry_date', 'updated_at', 'created_at'):
+            sort_by = 'entry_date'
+        descending = order.lower() != 'asc'
+        # The sort column must be loaded to merge, even if not serialized
+        load_fields = fields | {sort_by} if fields is not None else None
+        
+        # Live and archived entries share filter/sort columns; query both and merge
+        results = []
+        for model, options in (
+            (MedicalHistory, history_load_options(load_fields)),
+            (ArchivedHistory, archive_load_options(load_fields))
+        ):
+            query = model.query.filter_by(user_id=user_id).options(*options)
+            
+            if test_type:
+                query = query.filter_by(test_type_id=TestType.id_for(test_type))
+            if doctor_id:
+                query = query.filter_by(doctor_id=doctor_id)
+            
+            sort_column = getattr(model, sort_by)
+            query = query.order_by(sort_column.desc() if descending else sort_column.asc())
+            results.append(query.all())
+        
+        history = merge_history(*results, key=attrgetter(sort_by), reverse=descending)
         
         logger.info(f"Medical history retrieved for user: {user_info['uuid']}")
         
         return jsonify({
             'message': 'Medical history retrieved',
             'count': len(history),
-            'data': [h.to_dict() for h in history]
+            'data': [h.to_dict(fields=fields) for h in history]
         }), 200
     except Exception as e:
         logger.error(f"Error retrieving medical history: {str(e)}")
@@ -52,6 +72,7 @@ def get_medical_history():
 
 @user_bp.route('/generate-card', methods=['GET'])
 @require_role('user')
+@cost_class('render')
 def generate_card():
     try:
         user_info = get_current_user_info()
@@ -61,8 +82,8 @@ def generate_card():
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
-        # Generate QR code
-        qr_code = generate_qr_code(user.uuid)
+        # Generate QR code from the compact signed payload
+        qr_code = generate_qr_code(encode_qr_payload(user.uuid))
         
         # Generate user card image (Returns base64 string)
         card_image_b64 = generate_user_card(user.to_dict(), qr_code)
@@ -97,6 +118,35 @@ def generate_card():
         return jsonify({'message': 'Internal server error'}), 500
 
 
+@user_bp.route('/export', methods=['GET'])
+@require_role('user')
+def export_record():
+    try:
+        user_info = get_current_user_info()
+        
+        user = User.query.get(user_info['user_id'])
+        if not user:
+            return jsonify({'message': 'User not found'}), 404
+        
+        try:
+            cursor = parse_export_cursor(request.args.get('cursor'))
+            response = export_response(
+                user,
+                fmt=request.args.get('format', 'ndjson'),
+                cursor=cursor,
+                compress=request.args.get('gzip', '').lower() in ('1', 'true')
+            )
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        logger.info(f"Record export started for user: {user.uuid}, cursor: {cursor}")
+        
+        return response
+    except Exception as e:
+        logger.error(f"Error exporting record: {str(e)}")
+        return jsonify({'message': 'Internal server error'}), 500
+
+
 @user_bp.route('/profile', methods=['GET'])
 @require_role('user')
 def get_profile():
@@ -104,7 +154,12 @@ def get_profile():
         user_info = get_current_user_info()
         user_id = user_info['user_id']
         
-        user = User.query.get(user_id)
+        try:
+            fields = parse_fields(request.args.get('fields'), User)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        user = User.query.options(*load_options(User, fields)).filter_by(id=user_id).first()
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -112,7 +167,7 @@ def get_profile():
         
         return jsonify({
             'message': 'Profile retrieved',
-            'user': user.to_dict()
+            'user': user.to_dict(fields=fields)
         }), 200
     except Exception as e:
         logger.error(f"Error retrieving profile: {str(e)}")
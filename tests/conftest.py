@@ -0,0 +1,77 @@
+import json
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from app import app as flask_app
+from extensions import db
+from models import User, Doctor, TestType
+from utils.auth import hash_password
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        TestType._id_cache.clear()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    user = User(
+        email='patient@example.com',
+        password_hash=hash_password('secret'),
+        first_name='Pat',
+        last_name='Ient'
+    )
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def doctor(app):
+    doctor = Doctor(
+        email='doctor@example.com',
+        password_hash=hash_password('secret'),
+        first_name='Doc',
+        last_name='Tor',
+        license_number='LIC-1',
+        hospital='General'
+    )
+    db.session.add(doctor)
+    db.session.commit()
+    return doctor
+
+
+@pytest.fixture
+def doctor_headers(doctor):
+    token = create_access_token(identity=json.dumps({
+        'doctor_id': doctor.id,
+        'email': doctor.email,
+        'role': 'doctor'
+    }))
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def user_headers(user):
+    token = create_access_token(identity=json.dumps({
+        'user_id': user.id,
+        'uuid': user.uuid,
+        'role': 'user'
+    }))
+    return {'Authorization': f'Bearer {token}'}
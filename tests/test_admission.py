@@ -0,0 +1,37 @@
+from models import ThrottleBucket
+from utils.admission import SharedTokenBucketLimiter, init_admission
+
+
+def login(client, email='patient@example.com', password='secret'):
+    return client.post('/api/auth/user/login', json={'email': email, 'password': password})
+
+
+def test_login_throttle_is_stored_in_the_database(client, user):
+    for _ in range(5):
+        assert login(client).status_code == 200
+
+    response = login(client)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    assert ThrottleBucket.query.get('login_account:patient@example.com').tokens < 1
+
+
+def test_shared_buckets_are_seen_by_every_limiter(app):
+    # Two limiters stand in for two worker processes
+    first = SharedTokenBucketLimiter('login_ip', burst=2, per_minute=1)
+    second = SharedTokenBucketLimiter('login_ip', burst=2, per_minute=1)
+
+    assert first.consume('10.0.0.1') == 0
+    assert second.consume('10.0.0.1') == 0
+    assert first.consume('10.0.0.1') > 0
+    assert second.consume('10.0.0.2') == 0
+
+
+def test_cost_class_overrides_merge_with_defaults(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMISSION_COST_CLASSES', {'kdf': {'limit': 8}})
+    monkeypatch.setitem(app.extensions, 'admission', None)
+    init_admission(app)
+
+    classes = app.extensions['admission']['classes']
+    assert (classes['kdf'].limit, classes['kdf'].queue) == (8, 8)
+    assert classes['render'].limit == 2
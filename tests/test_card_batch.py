@@ -0,0 +1,39 @@
+import uuid
+
+from utils.admission import CostClassLimiter
+from utils.card_batch import load_card_items
+
+
+def test_load_card_items_normalizes_uuid_spellings(app, user):
+    compact = uuid.UUID(user.uuid).hex.upper()
+    braced = '{' + user.uuid + '}'
+
+    items, missing = load_card_items([compact, braced, 'not-a-uuid', str(uuid.uuid4())])
+
+    assert [item[0]['uuid'] for item in items] == [user.uuid]
+    assert missing[0] == 'not-a-uuid'
+    assert len(missing) == 2
+
+
+def test_batch_endpoint_streams_zip_for_hyphenless_uuid(client, user, doctor_headers):
+    response = client.post('/api/doctor/cards/batch', headers=doctor_headers, json={
+        'user_uuids': [uuid.UUID(user.uuid).hex],
+        'format': 'zip'
+    })
+    assert response.status_code == 200
+    assert response.get_data().startswith(b'PK')
+
+
+def test_concurrent_batch_is_rejected_while_a_stream_is_open(app, client, user, doctor_headers, monkeypatch):
+    monkeypatch.setitem(app.extensions['admission']['classes'], 'batch', CostClassLimiter('batch', 1, 0, 1.0))
+    body = {'user_uuids': [user.uuid], 'format': 'pdf'}
+
+    first = client.post('/api/doctor/cards/batch', headers=doctor_headers, json=body, buffered=False)
+    assert first.status_code == 200
+
+    second = client.post('/api/doctor/cards/batch', headers=doctor_headers, json=body)
+    assert second.status_code == 503
+
+    first.get_data()
+    first.close()
+    assert client.post('/api/doctor/cards/batch', headers=doctor_headers, json=body).status_code == 200
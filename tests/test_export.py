@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import MedicalHistory
+from utils.archive import archive_entries
+
+
+def add_history(client, user, doctor_headers, count=3):
+    ids = []
+    for i in range(count):
+        response = client.post('/api/doctor/add-medical-history', headers=doctor_headers, json={
+            'user_uuid': user.uuid,
+            'test_type': 'Blood Test',
+            'test_results': f'result {i}'
+        })
+        ids.append(response.get_json()['entry']['id'])
+    return ids
+
+
+def amend(client, entry_id, doctor_headers):
+    response = client.post(f'/api/doctor/amend-medical-history/{entry_id}', headers=doctor_headers, json={
+        'diagnosis': 'revised',
+        'reason': 'typo'
+    })
+    assert response.status_code == 200
+
+
+def test_ndjson_export_streams_live_and_archived_entries_with_amendments(client, user, doctor_headers, user_headers):
+    ids = add_history(client, user, doctor_headers)
+    amend(client, ids[0], doctor_headers)
+    amend(client, ids[2], doctor_headers)
+
+    # Move the amended first entry to the archive tier
+    MedicalHistory.query.get(ids[0]).entry_date = datetime.utcnow() - timedelta(days=400)
+    db.session.commit()
+    assert archive_entries(older_than_days=365) == 1
+
+    response = client.get('/api/user/export?format=ndjson', headers=user_headers)
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert [row['id'] for row in rows] == ids
+    assert [len(row.get('amendments', [])) for row in rows] == [1, 0, 1]
+    assert rows[0]['amendments'][0]['reason'] == 'typo'
+    assert rows[2]['diagnosis'] == 'revised'
+
+
+def test_csv_export_resumes_after_cursor(client, user, doctor_headers):
+    ids = add_history(client, user, doctor_headers)
+    amend(client, ids[1], doctor_headers)
+
+    response = client.get(
+        f'/api/doctor/export/{user.uuid}?format=csv&cursor={ids[0]}',
+        headers=doctor_headers
+    )
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+
+    assert [int(row['id']) for row in rows] == ids[1:]
+    assert len(json.loads(rows[0]['amendments'])) == 1
+    assert json.loads(rows[1]['amendments']) == []
+
+
+def test_export_rejects_invalid_cursor(client, user, user_headers):
+    response = client.get('/api/user/export?cursor=abc', headers=user_headers)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid cursor'
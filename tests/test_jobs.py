@@ -0,0 +1,112 @@
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models import Job
+from utils.jobs import JOB_TYPES, claim_next_job, run_render_cards_job, recover_stale_jobs, _start_job, _poll_job, _finish
+
+
+@pytest.fixture
+def job(user):
+    job = Job(job_type='export', params=json.dumps({'user_uuid': user.uuid}), owner_role='user', owner_id=user.id)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def run_to_completion(job, tmp_path, timeout=30):
+    process, conn, started = _start_job(job, str(tmp_path))
+    while True:
+        outcome = _poll_job(process, conn, started, timeout)
+        if outcome:
+            return outcome
+        time.sleep(0.05)
+
+
+def fail_with_value_error(params, result_path):
+    raise ValueError(f"User not found: {params['user_uuid']}")
+
+
+def hang(params, result_path):
+    time.sleep(60)
+
+
+def test_value_error_fails_without_retry(job, tmp_path, monkeypatch):
+    monkeypatch.setitem(JOB_TYPES['export'], 'handler', fail_with_value_error)
+    claim_next_job('host:1')
+
+    outcome = run_to_completion(job, tmp_path)
+    _finish(job.id, outcome, str(tmp_path), 'host:1')
+
+    assert job.status == 'failed'
+    assert job.attempts == 1
+    assert job.error.startswith('User not found')
+
+
+def test_overrunning_job_is_terminated_and_retried(job, tmp_path, monkeypatch):
+    monkeypatch.setitem(JOB_TYPES['export'], 'handler', hang)
+    claim_next_job('host:1')
+
+    start = time.monotonic()
+    outcome = run_to_completion(job, tmp_path, timeout=0.5)
+    _finish(job.id, outcome, str(tmp_path), 'host:1')
+
+    assert time.monotonic() - start < 10
+    assert job.status == 'queued'
+    assert job.error == 'Timed out after 0.5s'
+
+
+def test_only_jobs_with_a_stale_heartbeat_are_recovered(app, user):
+    now = datetime.utcnow()
+    fresh, stale = (
+        Job(job_type='export', params='{}', owner_role='user', owner_id=user.id, status='running',
+            attempts=1, worker_id=worker_id, started_at=now - timedelta(hours=5), heartbeat_at=heartbeat_at)
+        for worker_id, heartbeat_at in (('alive:1', now), ('dead:1', now - timedelta(minutes=10)))
+    )
+    db.session.add_all([fresh, stale])
+    db.session.commit()
+
+    assert recover_stale_jobs() == 1
+    assert (fresh.status, fresh.worker_id) == ('running', 'alive:1')
+    assert (stale.status, stale.worker_id) == ('queued', None)
+
+
+def test_result_past_ttl_is_gone_before_expiry_sweep(client, job, user_headers, tmp_path):
+    result = tmp_path / 'result.ndjson'
+    result.write_text('{}\n')
+    job.status = 'succeeded'
+    job.result_path = str(result)
+    job.expires_at = datetime.utcnow() - timedelta(minutes=1)
+    db.session.commit()
+
+    assert client.get(f'/api/jobs/{job.id}/result', headers=user_headers).status_code == 410
+    data = client.get(f'/api/jobs/{job.id}', headers=user_headers).get_json()['job']
+    assert data['status'] == 'expired'
+    assert 'result_url' not in data
+
+
+@pytest.mark.parametrize('body', [
+    {'type': 'export', 'params': [1, 2]},
+    {'type': 'export', 'params': 'format=csv'},
+    {'type': ['export']},
+    [{'type': 'export'}],
+])
+def test_submit_rejects_malformed_requests(client, user_headers, body):
+    response = client.post('/api/jobs', headers=user_headers, json=body)
+    assert response.status_code == 400
+
+
+def test_render_cards_job_fails_on_unknown_users(app, user, tmp_path):
+    unknown = str(uuid.uuid4())
+    with pytest.raises(ValueError, match=unknown):
+        run_render_cards_job({'user_uuids': [user.uuid, unknown], 'format': 'zip'}, str(tmp_path / 'out'))
+
+    mimetype, _ = run_render_cards_job(
+        {'user_uuids': [user.uuid, unknown], 'format': 'zip', 'skip_missing': True},
+        str(tmp_path / 'out')
+    )
+    assert mimetype == 'application/zip'
@@ -0,0 +1,29 @@
+import models
+from models import MedicalHistory
+
+
+def test_add_medical_history_canonicalizes_test_type(client, user, doctor_headers):
+    for test_type in ('Blood Test', '  blood   TEST '):
+        response = client.post('/api/doctor/add-medical-history', headers=doctor_headers, json={
+            'user_uuid': user.uuid,
+            'test_type': test_type,
+            'test_results': 'normal'
+        })
+        assert response.status_code == 201
+        assert response.get_json()['entry']['test_type'] == 'Blood Test'
+
+    assert models.TestType.query.count() == 1
+    assert MedicalHistory.query.count() == 2
+
+
+def test_history_filters_by_test_type_case_insensitively(client, user, doctor_headers, user_headers):
+    for test_type in ('X-Ray', 'Blood Test'):
+        client.post('/api/doctor/add-medical-history', headers=doctor_headers, json={
+            'user_uuid': user.uuid,
+            'test_type': test_type
+        })
+
+    response = client.get('/api/user/medical-history?test_type=x-ray', headers=user_headers)
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [entry['test_type'] for entry in data['data']] == ['X-Ray']
@@ -0,0 +1,197 @@
+"""Schema migrations and partition maintenance against a real Postgres.
+
+Skipped unless DATABASE_URL points at Postgres. The database is wiped, so
+use a throwaway one:
+
+    DATABASE_URL=postgresql://localhost/nexus_test python -m pytest tests/test_postgres_migrations.py
+"""
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get('DATABASE_URL', '').startswith('postgresql'),
+    reason='needs DATABASE_URL pointing at a Postgres database'
+)
+
+import models
+from extensions import db
+from models import MedicalHistory, ArchivedHistory
+from utils.partitions import is_partitioned, ensure_partitions
+
+# Tables as they were before compact_schema: string UUIDs and free-text test types
+BASELINE_SQL = [
+    """
+    CREATE TABLE users (
+        id SERIAL PRIMARY KEY, uuid VARCHAR(36) NOT NULL UNIQUE, email VARCHAR(120) NOT NULL UNIQUE,
+        password_hash VARCHAR(255) NOT NULL, first_name VARCHAR(120) NOT NULL, last_name VARCHAR(120) NOT NULL,
+        phone VARCHAR(20), date_of_birth DATE, gender VARCHAR(10), address TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT now(), updated_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE doctors (
+        id SERIAL PRIMARY KEY, email VARCHAR(120) NOT NULL UNIQUE, password_hash VARCHAR(255) NOT NULL,
+        first_name VARCHAR(120) NOT NULL, last_name VARCHAR(120) NOT NULL,
+        license_number VARCHAR(120) NOT NULL UNIQUE, hospital VARCHAR(255) NOT NULL,
+        specialization VARCHAR(120), phone VARCHAR(20),
+        created_at TIMESTAMP NOT NULL DEFAULT now(), updated_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE medical_history (
+        id SERIAL PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+        doctor_id INTEGER NOT NULL REFERENCES doctors (id), entry_date TIMESTAMP NOT NULL,
+        test_type VARCHAR(255) NOT NULL, test_results TEXT, diagnosis TEXT, prescription TEXT, notes TEXT,
+        is_amended BOOLEAN, created_at TIMESTAMP NOT NULL, updated_at TIMESTAMP NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE amendments (
+        id SERIAL PRIMARY KEY, medical_history_id INTEGER NOT NULL REFERENCES medical_history (id),
+        doctor_id INTEGER NOT NULL REFERENCES doctors (id), original_data TEXT NOT NULL,
+        amended_data TEXT NOT NULL, reason TEXT, created_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX ix_medical_history_doctor_recent ON medical_history (doctor_id, entry_date, id)",
+    "CREATE INDEX ix_medical_history_user_recent ON medical_history (user_id, entry_date)",
+]
+
+# (entry_date, test_type spelling); the first spelling of each type is its display name
+ENTRIES = [
+    (datetime(2019, 3, 1), 'blood  test'),
+    (datetime(2019, 6, 1), 'X-Ray'),
+    (datetime(2023, 5, 1), ' Blood Test'),
+    (datetime.utcnow().replace(microsecond=0), 'x-ray'),
+]
+
+
+def reset_schema():
+    db.session.remove()
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    models.TestType._id_cache.clear()
+
+
+def run_migration(module, monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', [module.__name__, *args])
+    module.main()
+
+
+def scalar(sql, **params):
+    with db.engine.connect() as conn:
+        return conn.execute(text(sql), params).scalar()
+
+
+@pytest.fixture
+def baseline(app):
+    reset_schema()
+    with db.engine.begin() as conn:
+        for statement in BASELINE_SQL:
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO users (uuid, email, password_hash, first_name, last_name) "
+            "VALUES ('6f1c2b0e-8d3a-4c55-9a7e-2b1d0c9e8f10', 'p@example.com', 'x', 'Pat', 'Ient')"
+        ))
+        conn.execute(text(
+            "INSERT INTO doctors (email, password_hash, first_name, last_name, license_number, hospital) "
+            "VALUES ('d@example.com', 'x', 'Doc', 'Tor', 'LIC-1', 'General')"
+        ))
+        for entry_date, test_type in ENTRIES:
+            conn.execute(text(
+                "INSERT INTO medical_history (user_id, doctor_id, entry_date, test_type, test_results, "
+                "is_amended, created_at, updated_at) VALUES (1, 1, :d, :t, 'result', false, :d, :d)"
+            ), {'d': entry_date, 't': test_type})
+        conn.execute(text(
+            "INSERT INTO amendments (medical_history_id, doctor_id, original_data, amended_data, reason) "
+            "VALUES (1, 1, '{}', '{}', 'typo')"
+        ))
+    # The app's create_all adds the new tables (test_types, archive, jobs) on first start
+    db.create_all()
+    yield
+    reset_schema()
+    db.create_all()
+
+
+def test_compact_partition_and_archive_keep_every_row(app, baseline, monkeypatch):
+    from migrations import compact_schema, partition_history
+
+    ids = [row[0] for row in db.session.execute(text("SELECT id FROM medical_history ORDER BY id"))]
+    db.session.remove()
+
+    run_migration(compact_schema, monkeypatch)
+    assert scalar("SELECT data_type FROM information_schema.columns "
+                  "WHERE table_name = 'users' AND column_name = 'uuid'") == 'uuid'
+    assert sorted(t.name for t in models.TestType.query.all()) == ['X-Ray', 'blood test']
+    db.session.remove()
+
+    run_migration(partition_history, monkeypatch, '--keep-old')
+    with db.engine.connect() as conn:
+        assert is_partitioned(conn)
+    assert scalar("SELECT count(*) FROM medical_history_unpartitioned") == len(ENTRIES)
+    assert scalar("SELECT count(*) FROM pg_indexes WHERE indexname IN "
+                  "('ix_medical_history_doctor_recent_old', 'ix_medical_history_user_recent_old')") == 2
+    assert [e.id for e in MedicalHistory.query.order_by(MedicalHistory.id)] == ids
+
+    # The id sequence carries on from the migrated rows
+    entry = MedicalHistory(user_id=1, doctor_id=1, test_type_id=models.TestType.id_for('x-ray'), test_results='new')
+    db.session.add(entry)
+    db.session.commit()
+    assert entry.id == ids[-1] + 1
+
+    result = app.test_cli_runner().invoke(args=['history', 'archive', '--older-than-days', '365'])
+    assert result.exit_code == 0, result.output
+    assert 'Archived 3 entries' in result.output
+
+    live = [e.id for e in MedicalHistory.query.order_by(MedicalHistory.id)]
+    archived = ArchivedHistory.query.order_by(ArchivedHistory.id).all()
+    assert sorted(live + [a.id for a in archived]) == ids + [entry.id]
+    assert archived[0].to_dict()['amendments'][0]['reason'] == 'typo'
+    assert archived[0].test_type == 'blood test'
+
+
+def test_new_partition_takes_rows_from_the_default_partition(app, baseline, monkeypatch):
+    from migrations import compact_schema, partition_history
+
+    run_migration(compact_schema, monkeypatch)
+    run_migration(partition_history, monkeypatch)
+
+    future = datetime.utcnow().year + 3
+    entry = MedicalHistory(user_id=1, doctor_id=1, test_type_id=models.TestType.id_for('x-ray'),
+                           entry_date=datetime(future, 2, 1))
+    db.session.add(entry)
+    db.session.commit()
+    entry_id = entry.id
+    db.session.remove()
+    assert scalar("SELECT count(*) FROM medical_history_default") == 1
+
+    with db.engine.begin() as conn:
+        assert ensure_partitions(conn, years_ahead=3)
+
+    assert scalar("SELECT count(*) FROM medical_history_default") == 0
+    assert scalar(f"SELECT id FROM medical_history_y{future}") == entry_id
+    assert scalar("SELECT count(*) FROM medical_history") == len(ENTRIES) + 1
+
+
+def test_concurrent_ensure_partitions_do_not_race(app, baseline, monkeypatch):
+    from migrations import compact_schema, partition_history
+
+    run_migration(compact_schema, monkeypatch)
+    run_migration(partition_history, monkeypatch)
+    engine = db.engine
+
+    def ensure():
+        with engine.begin() as conn:
+            return ensure_partitions(conn, years_ahead=8)
+
+    # Stands in for several hosts starting at once
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = [f.result() for f in [pool.submit(ensure) for _ in range(6)]]
+
+    assert results == [True] * 6
+    assert scalar(f"SELECT to_regclass('medical_history_y{datetime.utcnow().year + 8}') IS NOT NULL")
@@ -0,0 +1,59 @@
+from utils.qr_token import encode_qr_payload
+
+
+def test_scan_and_fetch_rejects_non_string_qr_data(client, doctor_headers):
+    response = client.post('/api/doctor/scan-and-fetch', headers=doctor_headers, json={'qr_data': 12345})
+    assert response.status_code == 400
+
+
+def test_scan_and_fetch_accepts_signed_payload(app, client, user, doctor_headers):
+    response = client.post('/api/doctor/scan-and-fetch', headers=doctor_headers, json={
+        'qr_data': encode_qr_payload(user.uuid)
+    })
+    assert response.status_code == 200
+    assert response.get_json()['user']['uuid'] == user.uuid
+
+
+def test_scan_and_fetch_pages_continue_on_the_history_endpoint(client, user, doctor_headers):
+    ids = [
+        client.post('/api/doctor/add-medical-history', headers=doctor_headers, json={
+            'user_uuid': user.uuid,
+            'test_type': 'Blood Test',
+            'test_results': f'result {i}'
+        }).get_json()['entry']['id']
+        for i in range(5)
+    ]
+
+    page = client.post('/api/doctor/scan-and-fetch?limit=2', headers=doctor_headers, json={
+        'qr_data': encode_qr_payload(user.uuid)
+    }).get_json()
+    seen = [entry['id'] for entry in page['data']]
+    assert page['has_more']
+
+    while page['next_cursor']:
+        page = client.get(
+            f"/api/doctor/user-medical-history/{user.uuid}?limit=2&cursor={page['next_cursor']}",
+            headers=doctor_headers
+        ).get_json()
+        seen += [entry['id'] for entry in page['data']]
+
+    assert seen == ids[::-1]
+
+
+def test_history_endpoint_rejects_invalid_cursor(client, user, doctor_headers):
+    response = client.get(f'/api/doctor/user-medical-history/{user.uuid}?cursor=abc', headers=doctor_headers)
+    assert response.status_code == 400
+
+
+def test_unsigned_cards_are_counted_until_disabled(app, client, user, doctor_headers, monkeypatch):
+    response = client.post('/api/doctor/scan-and-fetch', headers=doctor_headers, json={'qr_data': user.uuid})
+    assert response.status_code == 200
+    client.post('/api/doctor/scan-and-fetch', headers=doctor_headers, json={'qr_data': encode_qr_payload(user.uuid)})
+
+    unsigned = client.get('/health/qr').get_json()['unsigned']
+    assert (unsigned['allow_unsigned'], unsigned['accepted']) == (True, 1)
+
+    monkeypatch.setitem(app.config, 'QR_ALLOW_UNSIGNED', False)
+    response = client.post('/api/doctor/scan-and-fetch', headers=doctor_headers, json={'qr_data': user.uuid})
+    assert response.status_code == 400
+    assert client.get('/health/qr').get_json()['unsigned']['accepted'] == 1
@@ -0,0 +1,35 @@
+import json
+
+from flask import jsonify
+
+import utils.json_provider
+
+
+def test_jsonify_goes_through_orjson(app, monkeypatch):
+    calls = []
+    orjson_dumps = utils.json_provider.orjson.dumps
+    monkeypatch.setattr(utils.json_provider.orjson, 'dumps', lambda *a, **kw: calls.append(a) or orjson_dumps(*a, **kw))
+
+    payload = {'b': [1, 2], 'a': 'é', 3: None}
+    body = jsonify(payload).get_data(as_text=True)
+
+    assert calls
+    assert body == json.dumps({'3': None, 'a': 'é', 'b': [1, 2]}, separators=(',', ':'), ensure_ascii=False) + '\n'
+
+
+def test_query_user_accepts_fields_as_list(client, user, doctor_headers):
+    response = client.post('/api/doctor/query-user', headers=doctor_headers, json={
+        'user_uuid': user.uuid,
+        'fields': ['email']
+    })
+    assert response.status_code == 200
+    assert response.get_json()['user']['email'] == user.email
+    assert 'first_name' not in response.get_json()['user']
+
+
+def test_query_user_rejects_non_string_fields(client, user, doctor_headers):
+    response = client.post('/api/doctor/query-user', headers=doctor_headers, json={
+        'user_uuid': user.uuid,
+        'fields': [1]
+    })
+    assert response.status_code == 400
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models import MedicalHistory
+from utils.archive import archive_entries
+
+
+@pytest.fixture
+def entries(client, user, doctor_headers):
+    for test_type in ('X-Ray', 'Blood Test', 'MRI'):
+        client.post('/api/doctor/add-medical-history', headers=doctor_headers, json={
+            'user_uuid': user.uuid,
+            'test_type': test_type
+        })
+
+
+@pytest.mark.parametrize('limit', [0, -5])
+def test_worklist_clamps_non_positive_limits(client, entries, doctor_headers, limit):
+    response = client.get(f'/api/doctor/worklist?limit={limit}&patients_limit={limit}', headers=doctor_headers)
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['count'] == 1
+    assert data['next_cursor']
+    assert len(data['recent_patients']) == 1
+
+
+def test_worklist_pages_with_projected_fields(client, entries, doctor_headers):
+    response = client.get('/api/doctor/worklist?limit=2&fields=test_type', headers=doctor_headers)
+    data = response.get_json()
+    assert [entry['test_type'] for entry in data['data']] == ['MRI', 'Blood Test']
+
+    response = client.get(
+        f"/api/doctor/worklist?limit=2&fields=test_type&cursor={data['next_cursor']}",
+        headers=doctor_headers
+    )
+    data = response.get_json()
+    assert [entry['test_type'] for entry in data['data']] == ['X-Ray']
+    assert data['next_cursor'] is None
+
+
+def test_worklist_includes_archived_entries(client, user, entries, doctor_headers):
+    oldest = MedicalHistory.query.order_by(MedicalHistory.id).first()
+    oldest.entry_date = datetime.utcnow() - timedelta(days=400)
+    db.session.commit()
+    assert archive_entries(older_than_days=365) == 1
+
+    response = client.get('/api/doctor/worklist?limit=2', headers=doctor_headers)
+    data = response.get_json()
+    assert data['counts'] == {'entries': 3, 'patients': 1}
+    assert data['recent_patients'][0]['entry_count'] == 3
+
+    response = client.get(f"/api/doctor/worklist?limit=2&cursor={data['next_cursor']}", headers=doctor_headers)
+    data = response.get_json()
+    assert [entry['test_type'] for entry in data['data']] == ['X-Ray']
+    assert data['data'][0]['user']['uuid'] == user.uuid
+    assert data['next_cursor'] is None
@@ -0,0 +1,242 @@
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Response, current_app, jsonify, request
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import ThrottleBucket
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Cost class limiters live in each worker process. Under sync workers a
+# process serves one request at a time, so they never engage and the worker
+# count is the only bound; they matter in gevent mode (and the threaded dev
+# server), where one process runs many requests at once. Login buckets are
+# kept in the database so every process sees the same counts.
+
+# Cost class -> in-flight limit, max queued requests, max seconds to wait for a slot
+DEFAULT_COST_CLASSES = {
+    'kdf': {'limit': 4, 'queue': 8, 'wait': 2.0},       # login/signup password hashing
+    'render': {'limit': 2, 'queue': 4, 'wait': 5.0},    # PIL card generation
+    'decode': {'limit': 2, 'queue': 4, 'wait': 3.0},    # pyzbar QR decoding
+    'batch': {'limit': 2, 'queue': 0, 'wait': 10.0},    # streamed card batches, held per stream
+}
+
+class CostClassLimiter:
+    """Bounded concurrency for one cost class with a short wait queue"""
+
+    def __init__(self, name, limit, queue, wait):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self):
+        """Take a slot, queueing briefly. Returns False when saturated."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self.waiting >= self.queue:
+                    self.rejected += 1
+                    return False
+                self.waiting += 1
+            acquired = self._slots.acquire(timeout=self.wait)
+            with self._lock:
+                self.waiting -= 1
+                if not acquired:
+                    self.rejected += 1
+                    return False
+
+        with self._lock:
+            self.in_flight += 1
+            self.admitted += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'queue': self.queue,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'saturation': round(self.in_flight / self.limit, 2),
+                'admitted': self.admitted,
+                'rejected': self.rejected
+            }
+
+class TokenBucketLimiter:
+    """In-memory token buckets keyed by e.g. account or IP (one process only)"""
+
+    def __init__(self, burst, per_minute, max_keys=100000):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, last_refill)
+        self._lock = threading.Lock()
+
+    def consume(self, key):
+        """Take one token for `key`. Returns 0 if allowed, else seconds until retry."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state worth keeping
+        full_after = self.burst / self.rate
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < full_after}
+
+class SharedTokenBucketLimiter:
+    """Token buckets stored in the throttle_buckets table, shared across processes and hosts.
+
+    Each consume is one short transaction; on Postgres the row is locked so
+    concurrent logins for the same key are counted exactly.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, scope, burst, per_minute):
+        self.scope = scope
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self._calls = 0
+
+    def consume(self, key):
+        """Take one token for `key`. Returns 0 if allowed, else seconds until retry."""
+        bucket_key = f"{self.scope}:{key}"[:255]
+        for _ in range(2):
+            try:
+                return self._consume(bucket_key)
+            except IntegrityError:
+                # Another process created the bucket first; retry against its row
+                db.session.rollback()
+        return 0
+
+    def _consume(self, bucket_key):
+        now = datetime.utcnow()
+        bucket = ThrottleBucket.query.filter_by(key=bucket_key).with_for_update().first()
+        if bucket is None:
+            bucket = ThrottleBucket(key=bucket_key, tokens=self.burst, updated_at=now)
+            db.session.add(bucket)
+
+        tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at).total_seconds() * self.rate)
+        retry_after = 0 if tokens >= 1 else (1 - tokens) / self.rate
+        bucket.tokens = tokens - 1 if tokens >= 1 else tokens
+        bucket.updated_at = now
+        db.session.commit()
+
+        self._calls += 1
+        if self._calls % self.PRUNE_EVERY == 0:
+            self._prune(now)
+        return retry_after
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state worth keeping
+        full_since = now - timedelta(seconds=self.burst / self.rate)
+        ThrottleBucket.query.filter(
+            ThrottleBucket.key.startswith(f"{self.scope}:"),
+            ThrottleBucket.updated_at < full_since
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+def init_admission(app):
+    # Overrides are merged per class, so {"kdf": {"limit": 8}} keeps the other settings
+    classes = {name: dict(opts) for name, opts in DEFAULT_COST_CLASSES.items()}
+    for name, opts in (app.config.get('ADMISSION_COST_CLASSES') or {}).items():
+        classes.setdefault(name, {}).update(opts)
+
+    def bucket(scope, burst, per_minute):
+        # 'memory' suits a single process (dev server); 'database' is shared by all workers
+        if app.config.get('LOGIN_THROTTLE_STORE', 'database') == 'memory':
+            return TokenBucketLimiter(burst, per_minute)
+        return SharedTokenBucketLimiter(scope, burst, per_minute)
+
+    app.extensions['admission'] = {
+        'classes': {name: CostClassLimiter(name, **opts) for name, opts in classes.items()},
+        'login_account': bucket(
+            'login_account',
+            app.config.get('LOGIN_ACCOUNT_BURST', 5),
+            app.config.get('LOGIN_ACCOUNT_PER_MINUTE', 5)
+        ),
+        'login_ip': bucket(
+            'login_ip',
+            app.config.get('LOGIN_IP_BURST', 20),
+            app.config.get('LOGIN_IP_PER_MINUTE', 30)
+        ),
+    }
+
+def admission_metrics():
+    classes = current_app.extensions['admission']['classes']
+    return {name: limiter.snapshot() for name, limiter in classes.items()}
+
+def cost_class(name):
+    """Admit the wrapped route only while its cost class has capacity; else 503.
+
+    For a streamed response the slot is held until the stream is closed,
+    since that is when the work actually happens.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            limiter = current_app.extensions['admission']['classes'][name]
+            if not limiter.acquire():
+                logger.warning(f"Cost class '{name}' saturated, rejecting {request.path}")
+                response = jsonify({'message': 'Server busy, please retry'})
+                response.headers['Retry-After'] = str(math.ceil(limiter.wait))
+                return response, 503
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                limiter.release()
+                raise
+            if isinstance(result, Response) and result.is_streamed:
+                result.call_on_close(limiter.release)
+            else:
+                limiter.release()
+            return result
+        return wrapper
+    return decorator
+
+def login_throttle(fn):
+    """Per-account and per-IP token buckets, checked before the KDF slot is taken; else 429"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        admission = current_app.extensions['admission']
+        email = str((request.get_json(silent=True) or {}).get('email', '')).lower()
+        try:
+            retry_after = max(
+                admission['login_ip'].consume(request.remote_addr),
+                admission['login_account'].consume(email) if email else 0
+            )
+        except Exception as e:
+            # Fail open: a throttle store outage shouldn't lock everyone out
+            db.session.rollback()
+            logger.error(f"Login throttle unavailable: {str(e)}")
+            retry_after = 0
+        if retry_after:
+            logger.warning(f"Login throttled for email: {email}, IP: {request.remote_addr}")
+            response = jsonify({'message': 'Too many login attempts'})
+            response.headers['Retry-After'] = str(math.ceil(retry_after))
+            return response, 429
+        return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,43 @@
+import heapq
+from datetime import datetime, timedelta
+from sqlalchemy.orm import selectinload
+from extensions import db
+from models import MedicalHistory, Amendment, ArchivedHistory
+import logging
+
+logger = logging.getLogger(__name__)
+
+def archive_entries(older_than_days, batch_size=500):
+    """Move entries older than `older_than_days` into the compressed archive.
+
+    Works in batches, committing each, so it can run alongside live traffic
+    and be interrupted safely. Returns the number of entries archived.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived = 0
+
+    while True:
+        batch = (
+            MedicalHistory.query
+            .filter(MedicalHistory.entry_date < cutoff)
+            .options(selectinload(MedicalHistory.amendments).selectinload(Amendment.doctor))
+            .order_by(MedicalHistory.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+
+        for entry in batch:
+            db.session.add(ArchivedHistory.from_entry(entry))
+            db.session.delete(entry)  # amendments go with it via cascade
+        db.session.commit()
+
+        archived += len(batch)
+        logger.info(f"Archived {archived} medical history entries older than {cutoff.date()}")
+
+    return archived
+
+def merge_history(live, archived, key, reverse=False):
+    """Merge two lists already sorted by `key` into one sorted list"""
+    return list(heapq.merge(live, archived, key=key, reverse=reverse))
@@ -5,12 +5,15 @@ from functools import wraps
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
 from flask import jsonify
 import logging
+from utils.offload import offload
 
 logger = logging.getLogger(__name__)
 
+@offload
 def hash_password(password):
     return generate_password_hash(password)
 
+@offload
 def verify_password(password_hash, password):
     return check_password_hash(password_hash, password)
 
@@ -0,0 +1,198 @@
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from models import User
+from utils.qrcode_gen import render_card
+from utils.qr_token import encode_qr_payload
+from utils.fields import load_options
+from utils.offload import offload, gevent_active
+import logging
+
+logger = logging.getLogger(__name__)
+
+BATCH_FORMATS = {
+    'zip': 'application/zip',
+    'pdf': 'application/pdf',
+}
+
+# Printed size of one 600x400 card: 150 dpi -> 288x192 pt
+PDF_POINTS_PER_PIXEL = 72 / 150
+
+# Render processes are per web process, so a deployment runs workers x
+# CARD_RENDER_PROCESSES of them; keep the setting small. Under gevent the
+# pool isn't used: its management thread and futures don't mix with
+# monkey-patched threading, so cards render on the offload thread pool.
+_pool = None
+
+def _render_pool(processes):
+    # One long-lived pool per web process; spawning per request would dominate small batches
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=processes)
+    return _pool
+
+def load_card_items(user_uuids):
+    """Load all requested users in one query; returns (items in request order, missing uuids).
+
+    Each item is (user dict, signed QR payload). Signing needs the app
+    config, so it happens here rather than in the render processes.
+    """
+    requested, valid = [], []
+    for value in user_uuids:
+        try:
+            # Same canonical form UUIDType returns, whatever spelling was sent
+            canonical = str(uuid.UUID(str(value)))
+            valid.append(canonical)
+        except ValueError:
+            canonical = str(value)  # can't match any user; reported as missing
+        requested.append(canonical)
+
+    fields = {'uuid', 'first_name', 'last_name', 'email', 'phone', 'date_of_birth'}
+    users = (
+        User.query
+        .filter(User.uuid.in_(valid))
+        .options(*load_options(User, fields))
+        .all()
+    ) if valid else []
+    by_uuid = {user.uuid: user for user in users}
+
+    items, missing = [], []
+    for user_uuid in dict.fromkeys(requested):
+        user = by_uuid.get(user_uuid)
+        if user is None:
+            missing.append(user_uuid)
+            continue
+        items.append((user.to_dict(fields=fields), encode_qr_payload(user.uuid)))
+    return items, missing
+
+def iter_rendered(items, fmt, processes=1):
+    """Render cards in order across `processes` cores, keeping a bounded window in flight"""
+    if gevent_active():
+        for item in items:
+            yield item[0], _render_offloaded(item, fmt=fmt)
+        return
+
+    render = partial(_render_item, fmt=fmt)
+    if processes <= 1:
+        for item in items:
+            yield item[0], render(item)
+        return
+
+    pool = _render_pool(processes)
+    window = processes * 4
+    pending = deque()
+    for item in items:
+        pending.append((item[0], pool.submit(render, item)))
+        if len(pending) >= window:
+            user, future = pending.popleft()
+            yield user, future.result()
+    while pending:
+        user, future = pending.popleft()
+        yield user, future.result()
+
+def _render_item(item, fmt):
+    user, qr_data = item
+    return render_card(user, qr_data, fmt=fmt)
+
+_render_offloaded = offload(_render_item)
+
+class _ChunkSink:
+    """Write-only file object that lets zipfile stream to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def zip_chunks(rendered):
+    """Stream a ZIP of PNG cards; PNGs are already compressed, so entries are stored"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for user, png in rendered:
+            archive.writestr(f"NexusAI_Card_{user['uuid']}.png", png)
+            yield sink.drain()
+    yield sink.drain()  # central directory
+
+def pdf_chunks(rendered):
+    """Stream a multi-page PDF with one card per page.
+
+    Pages are written as they are rendered; the page tree, catalog and
+    xref table only need offsets and object numbers, so they go at the end.
+    Object 1 is the catalog and 2 the page tree; each card uses three more.
+    """
+    offsets = {}
+    position = 0
+    page_ids = []
+
+    def emit(obj_id, body, stream=None):
+        nonlocal position
+        offsets[obj_id] = position
+        data = f"{obj_id} 0 obj\n".encode() + body
+        if stream is not None:
+            data += b"\nstream\n" + stream + b"\nendstream"
+        data += b"\nendobj\n"
+        position += len(data)
+        return data
+
+    header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position = len(header)
+    yield header
+
+    next_id = 3
+    for _, (width, height, pixels) in rendered:
+        image_id, content_id, page_id = next_id, next_id + 1, next_id + 2
+        next_id += 3
+        page_w = round(width * PDF_POINTS_PER_PIXEL, 2)
+        page_h = round(height * PDF_POINTS_PER_PIXEL, 2)
+        content = f"q {page_w} 0 0 {page_h} 0 0 cm /Card Do Q".encode()
+
+        chunk = emit(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode /Length {len(pixels)} >>"
+        ).encode(), pixels)
+        chunk += emit(content_id, f"<< /Length {len(content)} >>".encode(), content)
+        chunk += emit(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_w} {page_h}] "
+            f"/Resources << /XObject << /Card {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode())
+        page_ids.append(page_id)
+        yield chunk
+
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids)
+    tail = emit(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode())
+    tail += emit(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    xref = [f"xref\n0 {next_id}\n", "0000000000 65535 f \n"]
+    xref += [f"{offsets[obj_id]:010d} 00000 n \n" for obj_id in range(1, next_id)]
+    xref.append(f"trailer\n<< /Size {next_id} /Root 1 0 R >>\nstartxref\n{position}\n%%EOF\n")
+    yield tail + ''.join(xref).encode()
+
+def card_batch_chunks(items, fmt, processes=1):
+    """Render and stream a batch, logging throughput when done"""
+    start = time.perf_counter()
+    count = 0
+
+    def counted(rendered):
+        nonlocal count
+        for result in rendered:
+            count += 1
+            yield result
+
+    rendered = counted(iter_rendered(items, fmt, processes=processes))
+    yield from zip_chunks(rendered) if fmt == 'zip' else pdf_chunks(rendered)
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Rendered {count} cards as {fmt} in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.1f} cards/s)")
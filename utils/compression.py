@@ -0,0 +1,54 @@
+import gzip
+from flask import request
+import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIMETYPES = ['application/json', 'text/plain', 'text/csv', 'application/x-ndjson']
+
+def init_compression(app):
+    """Register an after_request hook that compresses responses per Accept-Encoding"""
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)  # bytes; smaller bodies aren't worth the CPU
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BR_QUALITY', 4)
+    app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+
+    @app.after_request
+    def compress_response(response):
+        return _compress(app.config, response)
+
+def _supported_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+def _compress(config, response):
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or not 200 <= response.status_code < 300
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in config['COMPRESS_MIMETYPES']
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    body = response.get_data()
+    if len(body) < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoding = request.accept_encodings.best_match(_supported_encodings())
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=config['COMPRESS_BR_QUALITY'])
+    elif encoding == 'gzip':
+        compressed = gzip.compress(body, compresslevel=config['COMPRESS_LEVEL'])
+    else:
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
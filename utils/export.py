@@ -0,0 +1,114 @@
+import csv
+import heapq
+import io
+import json
+import zlib
+from operator import attrgetter
+from flask import Response, stream_with_context
+from models import MedicalHistory, ArchivedHistory
+from utils.fields import history_load_options, archive_load_options
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CSV_COLUMNS = [
+    'id', 'entry_date', 'test_type', 'test_results', 'diagnosis', 'prescription',
+    'notes', 'is_amended', 'created_at', 'updated_at', 'doctor', 'amendments'
+]
+
+def parse_export_cursor(raw):
+    """Parse the `cursor` query value (last entry id received); None when absent.
+
+    Raises ValueError for a value that isn't an integer, so a bad cursor
+    isn't mistaken for a fresh export.
+    """
+    if raw is None:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise ValueError('Invalid cursor')
+
+def iter_history(user_id, cursor=None, batch_size=500):
+    """Yield a user's history entries in id order from server-side cursors.
+
+    Live and archived entries keep their original ids, so both streams are
+    merged by id. `cursor` is the last entry id already received; export
+    resumes after it. Rows are fetched `batch_size` at a time so memory
+    stays flat.
+    """
+    streams = []
+    for model, options in (
+        (MedicalHistory, history_load_options(None)),
+        (ArchivedHistory, archive_load_options(None))
+    ):
+        query = (
+            model.query
+            .filter(model.user_id == user_id)
+            .options(*options)
+            .order_by(model.id.asc())
+            .yield_per(batch_size)
+        )
+        if cursor is not None:
+            query = query.filter(model.id > cursor)
+        streams.append(query)
+
+    yield from heapq.merge(*streams, key=attrgetter('id'))
+
+def ndjson_chunks(entries):
+    for entry in entries:
+        yield json.dumps(entry.to_dict(), separators=(',', ':')) + '\n'
+
+def csv_chunks(entries):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+
+    for entry in entries:
+        data = entry.to_dict()
+        # Nested objects don't fit in a cell; keep them as JSON
+        data['doctor'] = json.dumps(data['doctor']) if data.get('doctor') else ''
+        data['amendments'] = json.dumps(data.get('amendments', []))
+        writer.writerow(data)
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def gzip_chunks(chunks, level=6):
+    """Incrementally gzip a stream of text chunks"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_response(user, fmt='ndjson', cursor=None, compress=False, batch_size=500):
+    """Build a streaming Response with the user's full record.
+
+    Raises ValueError for an unsupported format.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    entries = iter_history(user.id, cursor=cursor, batch_size=batch_size)
+    chunks = ndjson_chunks(entries) if fmt == 'ndjson' else csv_chunks(entries)
+
+    filename = f'NexusAI_Record_{user.uuid}.{fmt}'
+    headers = {'Content-Disposition': f'attachment; filename={filename}'}
+    if compress:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers=headers
+    )
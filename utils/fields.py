@@ -0,0 +1,61 @@
+from sqlalchemy.orm import load_only, selectinload, lazyload
+from models import MedicalHistory, Amendment, ArchivedHistory
+import logging
+
+logger = logging.getLogger(__name__)
+
+def parse_fields(raw, model):
+    """Parse a `fields=a,b,c` query value (or a JSON list of names) against model.FIELD_COLUMNS.
+
+    Returns None when no projection was requested (serialize everything),
+    otherwise the set of requested fields plus the model's ALWAYS_FIELDS.
+    Raises ValueError listing any unknown field names, or if `raw` is
+    neither a string nor a list of strings.
+    """
+    if not raw:
+        return None
+
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    elif not isinstance(raw, list) or not all(isinstance(f, str) for f in raw):
+        raise ValueError('fields must be a comma-separated string or a list of field names')
+
+    requested = {f.strip() for f in raw if f.strip()}
+    unknown = requested - set(model.FIELD_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    return requested | set(model.ALWAYS_FIELDS)
+
+def load_options(model, fields):
+    """Build loader options so only the columns behind `fields` are SELECTed"""
+    if fields is None:
+        return []
+
+    columns = {
+        getattr(model, column)
+        for field in fields
+        for column in model.FIELD_COLUMNS[field]
+    }
+    return [load_only(*columns)]
+
+def history_load_options(fields):
+    """Loader options for MedicalHistory queries, eager-loading relationships only when serialized"""
+    options = load_options(MedicalHistory, fields)
+    if fields is not None and 'test_type' not in fields:
+        # Skip the default joined load of the test type name
+        options.append(lazyload(MedicalHistory.test_type_ref))
+    if fields is None or 'doctor' in fields:
+        options.append(selectinload(MedicalHistory.doctor))
+    if fields is None or 'amendments' in fields:
+        options.append(selectinload(MedicalHistory.amendments).selectinload(Amendment.doctor))
+    return options
+
+def archive_load_options(fields):
+    """Loader options for ArchivedHistory queries; amendments live in the payload"""
+    options = load_options(ArchivedHistory, fields)
+    if fields is not None and 'test_type' not in fields:
+        options.append(lazyload(ArchivedHistory.test_type_ref))
+    if fields is None or 'doctor' in fields:
+        options.append(selectinload(ArchivedHistory.doctor))
+    return options
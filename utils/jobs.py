@@ -0,0 +1,326 @@
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_, and_
+from extensions import db
+from models import Job, User
+from utils.export import EXPORT_FORMATS, iter_history, ndjson_chunks, csv_chunks
+from utils.card_batch import BATCH_FORMATS, load_card_items, card_batch_chunks
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ---- Handlers: run inside a job process with an app context ----
+# A ValueError means bad input (e.g. the user is gone) and fails the job
+# without retrying; any other exception is retried with backoff.
+
+def run_export_job(params, result_path):
+    """Full-record export of one user, written with the same serializers as /export"""
+    user = User.query.filter_by(uuid=params['user_uuid']).first()
+    if not user:
+        raise ValueError(f"User not found: {params['user_uuid']}")
+
+    fmt = params.get('format', 'ndjson')
+    entries = iter_history(user.id)
+    chunks = ndjson_chunks(entries) if fmt == 'ndjson' else csv_chunks(entries)
+
+    with open(result_path, 'w', encoding='utf-8', newline='') as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+    return EXPORT_FORMATS[fmt], f'NexusAI_Record_{user.uuid}.{fmt}'
+
+def run_render_cards_job(params, result_path):
+    """Render medical cards for a list of users into a ZIP of PNGs or a multi-page PDF"""
+    fmt = params.get('format', 'zip')
+    items, missing = load_card_items(params['user_uuids'])
+    # Same rule as POST /api/doctor/cards/batch: unknown users fail the job unless skipped
+    if missing and not params.get('skip_missing'):
+        raise ValueError(f"Users not found: {', '.join(missing)}")
+    if not items:
+        raise ValueError('No users found')
+
+    # Already inside a job process, so render inline rather than starting a pool
+    with open(result_path, 'wb') as f:
+        for chunk in card_batch_chunks(items, fmt, processes=1):
+            f.write(chunk)
+
+    return BATCH_FORMATS[fmt], f'NexusAI_Cards.{fmt}'
+
+def validate_export_params(params, claims):
+    if params.get('format', 'ndjson') not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {params.get('format')}")
+    if claims['role'] == 'user':
+        # Patients may only export their own record
+        params['user_uuid'] = claims['uuid']
+    elif not params.get('user_uuid'):
+        raise ValueError('Missing user_uuid')
+    return params
+
+def validate_render_cards_params(params, claims):
+    uuids = params.get('user_uuids')
+    if not isinstance(uuids, list) or not uuids:
+        raise ValueError('user_uuids must be a non-empty list')
+    if len(uuids) > current_app.config['JOB_MAX_CARDS']:
+        raise ValueError(f"At most {current_app.config['JOB_MAX_CARDS']} cards per job")
+    if params.get('format', 'zip') not in BATCH_FORMATS:
+        raise ValueError(f"Unsupported format: {params.get('format')}")
+    return {
+        'user_uuids': [str(u) for u in uuids],
+        'format': params.get('format', 'zip'),
+        'skip_missing': bool(params.get('skip_missing'))
+    }
+
+# Job type -> handler, parameter validator, roles allowed to submit
+JOB_TYPES = {
+    'export': {
+        'handler': run_export_job,
+        'validate': validate_export_params,
+        'roles': ('user', 'doctor'),
+    },
+    'render_cards': {
+        'handler': run_render_cards_job,
+        'validate': validate_render_cards_params,
+        'roles': ('doctor',),
+    },
+}
+
+# ---- Submission (web side) ----
+
+def owner_of(claims):
+    if claims['role'] == 'doctor':
+        return 'doctor', claims['doctor_id']
+    return 'user', claims['user_id']
+
+def submit_job(job_type, params, claims):
+    """Validate and enqueue a job. Raises ValueError / PermissionError."""
+    if not isinstance(job_type, str):
+        raise ValueError('Job type must be a string')
+    if params is not None and not isinstance(params, dict):
+        raise ValueError('params must be an object')
+
+    spec = JOB_TYPES.get(job_type)
+    if not spec:
+        raise ValueError(f"Unknown job type: {job_type}")
+    if claims.get('role') not in spec['roles']:
+        raise PermissionError(f"Role not allowed to submit {job_type} jobs")
+
+    params = spec['validate'](dict(params or {}), claims)
+    owner_role, owner_id = owner_of(claims)
+
+    job = Job(
+        job_type=job_type,
+        params=json.dumps(params),
+        owner_role=owner_role,
+        owner_id=owner_id,
+        max_attempts=current_app.config['JOB_MAX_ATTEMPTS']
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+# ---- Worker (runner side) ----
+
+def claim_next_job(worker_id):
+    """Atomically move the oldest runnable job to 'running'; returns it or None"""
+    query = (
+        Job.query
+        .filter(Job.status == 'queued', Job.run_after <= datetime.utcnow())
+        .order_by(Job.run_after)
+        .limit(1)
+    )
+    if db.engine.dialect.name == 'postgresql':
+        # Lets several worker hosts poll the same table without double-claiming
+        query = query.with_for_update(skip_locked=True)
+
+    job = query.first()
+    if not job:
+        db.session.rollback()
+        return None
+
+    job.status = 'running'
+    job.attempts += 1
+    job.started_at = job.heartbeat_at = datetime.utcnow()
+    job.worker_id = worker_id
+    db.session.commit()
+    return job
+
+def _run_job(job_type, params, result_path, conn):
+    """Entry point of a job's own process; reports ('ok', (mimetype, filename)) or ('error', message, retry)"""
+    from app import app
+    with app.app_context():
+        # Forked children must not share the parent's pooled DB connections
+        db.engine.dispose(close=False)
+        try:
+            conn.send(('ok', JOB_TYPES[job_type]['handler'](params, result_path)))
+        except ValueError as e:
+            conn.send(('error', str(e), False))
+        except Exception as e:
+            conn.send(('error', str(e), True))
+        finally:
+            db.session.remove()
+            conn.close()
+
+def _start_job(job, results_dir):
+    conn, child_conn = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=_run_job,
+        args=(job.job_type, json.loads(job.params), os.path.join(results_dir, job.id), child_conn),
+        daemon=True
+    )
+    process.start()
+    child_conn.close()
+    return process, conn, time.monotonic()
+
+def _poll_job(process, conn, started, timeout):
+    """Outcome of a job process once it reports, dies or overruns `timeout`; None while running"""
+    outcome = None
+    if conn.poll():
+        try:
+            outcome = conn.recv()
+        except EOFError:
+            # Exited without reporting, e.g. killed for memory
+            process.join()
+            outcome = ('error', f'Job process exited with code {process.exitcode}', True)
+    elif time.monotonic() - started > timeout:
+        process.terminate()
+        outcome = ('error', f'Timed out after {timeout}s', True)
+
+    if outcome:
+        process.join()
+        conn.close()
+    return outcome
+
+def _finish(job_id, outcome, results_dir, worker_id):
+    job = Job.query.get(job_id)
+    if job.status != 'running' or job.worker_id != worker_id:
+        # Another worker took it over after our heartbeat lapsed
+        logger.warning(f"Job {job_id} no longer owned by {worker_id}, discarding its outcome")
+        db.session.rollback()
+        return
+
+    now = datetime.utcnow()
+    if outcome[0] == 'error':
+        _, message, retry = outcome
+        logger.error(f"Job {job_id} ({job.job_type}) attempt {job.attempts} failed: {message}")
+        job.error = message
+        job.worker_id = None
+        if retry and job.attempts < job.max_attempts:
+            # Exponential backoff: 10s, 20s, 40s, ...
+            job.status = 'queued'
+            job.run_after = now + timedelta(seconds=10 * 2 ** (job.attempts - 1))
+        else:
+            job.status = 'failed'
+            job.finished_at = now
+            partial = os.path.join(results_dir, job.id)
+            if os.path.exists(partial):
+                os.remove(partial)
+    else:
+        mimetype, filename = outcome[1]
+        job.status = 'succeeded'
+        job.error = None
+        job.finished_at = now
+        job.expires_at = now + timedelta(hours=current_app.config['JOB_RESULT_TTL_HOURS'])
+        job.result_path = os.path.join(results_dir, job.id)
+        job.result_mimetype = mimetype
+        job.result_filename = filename
+        logger.info(f"Job {job_id} ({job.job_type}) succeeded")
+    db.session.commit()
+
+def _heartbeat(worker_id, job_ids):
+    """Mark this worker's running jobs as alive so other hosts leave them alone"""
+    if job_ids:
+        Job.query.filter(Job.id.in_(job_ids), Job.worker_id == worker_id).update(
+            {'heartbeat_at': datetime.utcnow()}, synchronize_session=False
+        )
+    db.session.commit()
+
+def expire_results():
+    """Delete result files past their TTL"""
+    expired = Job.query.filter(Job.status == 'succeeded', Job.expires_at < datetime.utcnow()).all()
+    for job in expired:
+        if job.result_path and os.path.exists(job.result_path):
+            os.remove(job.result_path)
+        job.status = 'expired'
+    db.session.commit()
+    return len(expired)
+
+def recover_stale_jobs():
+    """Requeue jobs whose worker stopped heartbeating (it died or lost the database)"""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=current_app.config['JOB_HEARTBEAT_TIMEOUT_SECONDS'])
+    stale = Job.query.filter(
+        Job.status == 'running',
+        or_(
+            Job.heartbeat_at < cutoff,
+            # Claimed before heartbeats existed
+            and_(
+                Job.heartbeat_at.is_(None),
+                Job.started_at < now - timedelta(seconds=current_app.config['JOB_TIMEOUT_SECONDS'])
+            )
+        )
+    ).all()
+    for job in stale:
+        logger.warning(f"Requeueing job {job.id} from unresponsive worker {job.worker_id}")
+        job.error = 'Worker stopped responding'
+        job.worker_id = None
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+        else:
+            job.status = 'failed'
+            job.finished_at = now
+    db.session.commit()
+    return len(stale)
+
+def run_worker(concurrency, poll_interval=1.0, housekeeping_interval=60.0, heartbeat_interval=15.0):
+    """Claim jobs and run up to `concurrency` at once, each in its own process. Runs until interrupted.
+
+    A process per job (rather than a pool) lets a job that overruns
+    JOB_TIMEOUT_SECONDS be terminated without disturbing the others.
+    """
+    results_dir = os.path.abspath(current_app.config['JOB_RESULTS_DIR'])
+    os.makedirs(results_dir, exist_ok=True)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    timeout = current_app.config['JOB_TIMEOUT_SECONDS']
+    running = {}  # job id -> (process, result pipe, start time)
+    last_housekeeping = last_heartbeat = 0.0
+
+    logger.info(f"Job worker {worker_id} started with concurrency {concurrency}")
+
+    try:
+        while True:
+            for job_id, (process, conn, started) in list(running.items()):
+                outcome = _poll_job(process, conn, started, timeout)
+                if outcome:
+                    del running[job_id]
+                    _finish(job_id, outcome, results_dir, worker_id)
+
+            while len(running) < concurrency:
+                job = claim_next_job(worker_id)
+                if not job:
+                    break
+                running[job.id] = _start_job(job, results_dir)
+                logger.info(f"Job {job.id} ({job.job_type}) started, attempt {job.attempts}")
+
+            if time.monotonic() - last_heartbeat > heartbeat_interval:
+                _heartbeat(worker_id, list(running))
+                last_heartbeat = time.monotonic()
+
+            if time.monotonic() - last_housekeeping > housekeeping_interval:
+                expire_results()
+                recover_stale_jobs()
+                last_housekeeping = time.monotonic()
+
+            if running:
+                multiprocessing.connection.wait([conn for _, conn, _ in running.values()], timeout=poll_interval)
+            else:
+                time.sleep(poll_interval)
+    finally:
+        # Unfinished jobs are requeued by recover_stale_jobs once the heartbeat lapses
+        for process, _, _ in running.values():
+            process.terminate()
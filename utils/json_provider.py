@@ -0,0 +1,62 @@
+from flask.json.provider import DefaultJSONProvider
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson when installed, otherwise the stdlib.
+
+    Flask always passes either compact `separators` or `indent=2` (debug
+    mode); both map onto orjson output. Other options, such as a custom
+    `cls`, fall back to the default.
+    """
+
+    def dumps(self, obj, **kwargs):
+        options = self._options(kwargs)
+        if options is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=options).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """Serialize straight to bytes, skipping the str round trip of the default"""
+        if orjson is None:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            options |= orjson.OPT_INDENT_2
+
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=options),
+            mimetype=self.mimetype
+        )
+
+    def _options(self, kwargs):
+        """orjson options equivalent to the json.dumps kwargs, or None if there are none"""
+        if orjson is None:
+            return None
+
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        for key, value in kwargs.items():
+            if key == 'separators' and tuple(value) == (',', ':'):
+                continue
+            if key == 'indent' and value == 2:
+                options |= orjson.OPT_INDENT_2
+                continue
+            return None
+        return options
@@ -0,0 +1,56 @@
+import os
+from functools import wraps
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Native threads used for CPU-bound work under gevent workers
+OFFLOAD_THREADS = int(os.environ.get('OFFLOAD_THREADS', os.cpu_count() or 4))
+
+_native_local = None
+
+def gevent_active():
+    """True when running under a monkey-patched gevent worker"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+def _state():
+    # A real (unpatched) thread-local, so pool threads can be recognised
+    global _native_local
+    if _native_local is None:
+        from gevent.monkey import get_original
+        _native_local = get_original('threading', 'local')()
+    return _native_local
+
+def _threadpool():
+    import gevent
+    pool = gevent.get_hub().threadpool
+    if pool.maxsize < OFFLOAD_THREADS:
+        pool.maxsize = OFFLOAD_THREADS
+    return pool
+
+def _run_in_pool(fn, args, kwargs):
+    state = _state()
+    state.in_pool = True
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        state.in_pool = False
+
+def offload(fn):
+    """Run a blocking, CPU-bound function on a native thread under gevent.
+
+    Password hashing, PIL rendering and pyzbar decoding spend their time in
+    C code that releases the GIL, so a thread pool gives real parallelism
+    while the event loop keeps serving other greenlets. Under sync workers
+    (no monkey-patching) the function is simply called inline.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not gevent_active() or getattr(_state(), 'in_pool', False):
+            return fn(*args, **kwargs)
+        return _threadpool().apply(_run_in_pool, (fn, args, kwargs))
+    return wrapper
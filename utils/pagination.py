@@ -0,0 +1,19 @@
+import base64
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+def encode_cursor(entry_date, entry_id):
+    """Opaque keyset cursor for (entry_date, id) ordered listings"""
+    raw = f"{entry_date.isoformat()}|{entry_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (entry_date, id) from a cursor. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        entry_date, entry_id = raw.split('|')
+        return datetime.fromisoformat(entry_date), int(entry_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
@@ -0,0 +1,77 @@
+from datetime import datetime
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+# medical_history is range-partitioned by entry_date into yearly partitions
+# named medical_history_y<year>, plus medical_history_default as a catch-all.
+
+def is_partitioned(conn):
+    return conn.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = 'medical_history'
+    """)).first() is not None
+
+# Serializes partition maintenance across processes and hosts (arbitrary constant)
+PARTITION_LOCK_ID = 0x6E78_6D68
+
+def _exists(conn, name):
+    return conn.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar() is not None
+
+def create_partition(conn, year):
+    """Create the partition for `year`, moving any of its rows out of the default partition.
+
+    Postgres refuses a new partition while the default partition holds rows
+    in its range, so the default is detached, drained into the new
+    partition and re-attached, all in the caller's transaction.
+    """
+    name = f"medical_history_y{year:04d}"
+    if _exists(conn, name):
+        return
+
+    bounds = {'start': f"{year:04d}-01-01", 'end': f"{year + 1:04d}-01-01"}
+    has_default = _exists(conn, 'medical_history_default')
+    stranded = has_default and conn.execute(text(
+        "SELECT 1 FROM medical_history_default WHERE entry_date >= :start AND entry_date < :end LIMIT 1"
+    ), bounds).first() is not None
+
+    if stranded:
+        conn.execute(text("ALTER TABLE medical_history DETACH PARTITION medical_history_default"))
+
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF medical_history "
+        f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    ))
+
+    if stranded:
+        moved = conn.execute(text(
+            f"WITH moved AS ("
+            f"DELETE FROM medical_history_default WHERE entry_date >= :start AND entry_date < :end RETURNING *"
+            f") INSERT INTO {name} SELECT * FROM moved"
+        ), bounds).rowcount
+        conn.execute(text("ALTER TABLE medical_history ATTACH PARTITION medical_history_default DEFAULT"))
+        logger.info(f"Moved {moved} rows from medical_history_default into {name}")
+
+def ensure_partitions(conn, years_ahead=1, first_year=None):
+    """Create yearly partitions from `first_year` (default: this year) through `years_ahead` years out.
+
+    No-op unless medical_history is partitioned. Holds an advisory lock for
+    the transaction, so concurrent callers (several hosts, cron) run one
+    at a time. Run it from `flask history ensure-partitions` or gunicorn's
+    on_starting hook, not from every worker.
+    """
+    if conn.dialect.name != 'postgresql' or not is_partitioned(conn):
+        return False
+
+    conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {'id': PARTITION_LOCK_ID})
+
+    current_year = datetime.utcnow().year
+    for year in range(first_year or current_year, current_year + years_ahead + 1):
+        create_partition(conn, year)
+    if not _exists(conn, 'medical_history_default'):
+        conn.execute(text("CREATE TABLE medical_history_default PARTITION OF medical_history DEFAULT"))
+
+    logger.info(f"medical_history partitions ensured through {current_year + years_ahead}")
+    return True
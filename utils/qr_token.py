@@ -0,0 +1,87 @@
+import base64
+import hashlib
+import hmac
+import threading
+import uuid
+from flask import current_app
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Payload layout: NX1.<base32 uuid bytes>.<base32 truncated HMAC>
+# Base32 (A-Z2-7) plus '.' stays inside the QR alphanumeric charset, so the
+# 47-char payload fits a version 2 code instead of byte-mode version 3.
+PAYLOAD_PREFIX = 'NX1'
+MAC_BYTES = 10
+
+_unsigned_lock = threading.Lock()
+
+def _b32encode(raw):
+    return base64.b32encode(raw).decode('ascii').rstrip('=')
+
+def _b32decode(text):
+    return base64.b32decode(text + '=' * (-len(text) % 8))
+
+def _signing_key():
+    key = current_app.config.get('QR_SIGNING_KEY') or current_app.config['JWT_SECRET_KEY']
+    return key.encode('utf-8')
+
+def _mac(raw_id):
+    digest = hmac.new(_signing_key(), PAYLOAD_PREFIX.encode('ascii') + raw_id, hashlib.sha256).digest()
+    return digest[:MAC_BYTES]
+
+def encode_qr_payload(user_uuid):
+    """Encode a user UUID as a compact signed QR payload"""
+    raw_id = uuid.UUID(str(user_uuid)).bytes
+    return f"{PAYLOAD_PREFIX}.{_b32encode(raw_id)}.{_b32encode(_mac(raw_id))}"
+
+def _count_unsigned(user_uuid):
+    with _unsigned_lock:
+        stats = current_app.extensions.setdefault('qr_unsigned', {'accepted': 0, 'last_accepted_at': None})
+        stats['accepted'] += 1
+        stats['last_accepted_at'] = datetime.utcnow().isoformat()
+    # Cards still in circulation that need reprinting before QR_ALLOW_UNSIGNED can be turned off
+    logger.warning(f"Accepted unsigned QR card for user: {user_uuid}")
+
+def unsigned_qr_metrics():
+    """Unsigned card accepts seen by this process since start"""
+    stats = current_app.extensions.get('qr_unsigned') or {'accepted': 0, 'last_accepted_at': None}
+    return {'allow_unsigned': current_app.config.get('QR_ALLOW_UNSIGNED', True), **stats}
+
+def decode_qr_payload(payload):
+    """Verify a scanned QR payload and return the user UUID string.
+
+    Legacy cards embed the bare UUID; they are accepted while
+    QR_ALLOW_UNSIGNED is enabled; each accept is logged and counted (see
+    unsigned_qr_metrics). Raises ValueError for malformed or forged
+    payloads (including non-string values from JSON bodies), without
+    touching the database.
+    """
+    if not isinstance(payload, str):
+        raise ValueError('QR payload must be a string')
+
+    payload = payload.strip()
+    parts = payload.split('.')
+
+    if len(parts) != 3 or parts[0] != PAYLOAD_PREFIX:
+        if current_app.config.get('QR_ALLOW_UNSIGNED', True):
+            try:
+                user_uuid = str(uuid.UUID(payload))
+            except ValueError:
+                pass
+            else:
+                _count_unsigned(user_uuid)
+                return user_uuid
+        raise ValueError('Unrecognized QR payload')
+
+    try:
+        raw_id = _b32decode(parts[1])
+        mac = _b32decode(parts[2])
+    except Exception:
+        raise ValueError('Malformed QR payload')
+
+    if len(raw_id) != 16 or not hmac.compare_digest(mac, _mac(raw_id)):
+        raise ValueError('Invalid QR signature')
+
+    return str(uuid.UUID(bytes=raw_id))
@@ -1,24 +1,82 @@
 import qrcode
 from io import BytesIO
 import base64
+import zlib
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
 import logging
+from utils.offload import offload
 
 logger = logging.getLogger(__name__)
 
+def _qr_image(data):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.make_image(fill_color="black", back_color="white")
+
+@lru_cache(maxsize=1)
+def _card_fonts():
+    # Try to use a system font, fallback to default
+    try:
+        title_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 24)
+        text_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14)
+    except:
+        title_font = ImageFont.load_default()
+        text_font = ImageFont.load_default()
+    return title_font, text_font
+
+def build_card_image(user, qr_img):
+    """Draw the 600x400 medical card for a user dict and return the PIL image"""
+    img = Image.new('RGB', (600, 400), color='white')
+    draw = ImageDraw.Draw(img)
+    title_font, text_font = _card_fonts()
+    
+    # Draw card header
+    draw.rectangle([(0, 0), (600, 60)], fill='#2E86AB')
+    draw.text((20, 15), "NEXUS Lite - Medical Card", fill='white', font=title_font)
+    
+    # Draw user details
+    y_position = 80
+    draw.text((20, y_position), f"Name: {user['first_name']} {user['last_name']}", fill='black', font=text_font)
+    y_position += 30
+    draw.text((20, y_position), f"UUID: {user['uuid']}", fill='black', font=text_font)
+    y_position += 30
+    draw.text((20, y_position), f"Email: {user['email']}", fill='black', font=text_font)
+    y_position += 30
+    draw.text((20, y_position), f"Phone: {user['phone'] or 'N/A'}", fill='black', font=text_font)
+    y_position += 30
+    draw.text((20, y_position), f"Date of Birth: {user['date_of_birth'] or 'N/A'}", fill='black', font=text_font)
+    
+    # Add QR code
+    qr_img = qr_img.resize((150, 150))
+    img.paste(qr_img, (420, 150))
+    return img
+
+def render_card(user, qr_data, fmt='png'):
+    """Render one card without the base64 round trip; used by batch printing.
+
+    Returns PNG bytes for 'png', or (width, height, zlib-compressed RGB) for
+    'pdf' so the page can be embedded as a FlateDecode image directly.
+    """
+    img = build_card_image(user, _qr_image(qr_data))
+    if fmt == 'pdf':
+        return img.width, img.height, zlib.compress(img.tobytes(), 6)
+    
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+@offload
 def generate_qr_code(data):
     """Generate QR code from data and return as base64"""
     try:
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
+        img = _qr_image(data)
         buffer = BytesIO()
         img.save(buffer, format='PNG')
         buffer.seek(0)
@@ -30,41 +88,12 @@ def generate_qr_code(data):
         logger.error(f"Error generating QR code: {str(e)}")
         raise
 
+@offload
 def generate_user_card(user, qr_code_base64):
     """Generate user card image with details and QR code"""
     try:
-        # Create image
-        img = Image.new('RGB', (600, 400), color='white')
-        draw = ImageDraw.Draw(img)
-        
-        # Try to use a system font, fallback to default
-        try:
-            title_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 24)
-            text_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14)
-        except:
-            title_font = ImageFont.load_default()
-            text_font = ImageFont.load_default()
-        
-        # Draw card header
-        draw.rectangle([(0, 0), (600, 60)], fill='#2E86AB')
-        draw.text((20, 15), "NEXUS Lite - Medical Card", fill='white', font=title_font)
-        
-        # Draw user details
-        y_position = 80
-        draw.text((20, y_position), f"Name: {user['first_name']} {user['last_name']}", fill='black', font=text_font)
-        y_position += 30
-        draw.text((20, y_position), f"UUID: {user['uuid']}", fill='black', font=text_font)
-        y_position += 30
-        draw.text((20, y_position), f"Email: {user['email']}", fill='black', font=text_font)
-        y_position += 30
-        draw.text((20, y_position), f"Phone: {user['phone'] or 'N/A'}", fill='black', font=text_font)
-        y_position += 30
-        draw.text((20, y_position), f"Date of Birth: {user['date_of_birth'] or 'N/A'}", fill='black', font=text_font)
-        
-        # Add QR code
         qr_img = Image.open(BytesIO(base64.b64decode(qr_code_base64)))
-        qr_img = qr_img.resize((150, 150))
-        img.paste(qr_img, (420, 150))
+        img = build_card_image(user, qr_img)
         
         # Save to buffer
         buffer = BytesIO()
@@ -77,3 +106,26 @@ def generate_user_card(user, qr_code_base64):
     except Exception as e:
         logger.error(f"Error generating user card: {str(e)}")
         raise
+
+
+@offload
+def decode_qr_image(stream):
+    """Decode the first QR code in an image stream and return its text, or None"""
+    # Imported lazily so card generation works on hosts without libzbar
+    from pyzbar.pyzbar import decode
+    from PIL import ImageEnhance, ImageFilter
+
+    image = Image.open(stream)
+
+    # Greyscale + contrast boost helps with noisy backgrounds
+    image = image.convert('L')
+    image = ImageEnhance.Contrast(image).enhance(2.0)
+
+    decoded_objects = decode(image)
+    if not decoded_objects:
+        # Fallback: sharpen and retry
+        decoded_objects = decode(image.filter(ImageFilter.SHARPEN))
+
+    if not decoded_objects:
+        return None
+    return decoded_objects[0].data.decode('utf-8')